@@ -0,0 +1,195 @@
+# Offline benchmarks for MYSNOWSIGHT's hot paths, run against the simulated connector in
+# snowflake_sim.py instead of a live account:
+#   queries-N      N statements through AsyncQueryEngine (PARALLEL EXECUTE)
+#   load-N         an N-row CSV through infer_load_schema + apply_load_dtypes + bulk_load_chunks (LOAD FILE)
+#   replicate-N    N tables through replicate_tables (REPLICATE DATABASE), streamed through the app;
+#                  replicate-unload-N / replicate-clone-N use the stage unload and CLONE copy modes
+# Every scenario runs in its own subprocess so peak RSS is per scenario. Results are compared with
+# benchmark_baselines.json and anything that got slower or bigger than the tolerance is flagged.
+#
+#   python benchmark.py                      run everything and compare with the baselines
+#   python benchmark.py queries-100 load-*   run some scenarios
+#   python benchmark.py --update-baselines   run and store the results as the new baselines
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import snowflake_sim
+
+BASELINES = pathlib.Path(__file__).with_name("benchmark_baselines.json")
+SOURCE_CREDS = ("simaccount", "SYSADMIN", "BENCH_WH", "SRC", "PUBLIC", "bench", "secret")
+DEST_CREDS = ("simaccount", "SYSADMIN", "BENCH_WH", "DST", "PUBLIC", "bench", "secret")
+SIM_DEFAULTS = {"connect_latency": 0.2, "statement_latency": 0.05, "per_row_cost": 2e-7, "max_concurrency": 8,
+                "bandwidth": 100e6, "batch_rows": 100000}
+
+
+# Import the app with its Snowflake access pointed at `sim`: a fresh connection pool that opens
+# simulated sessions, and write_pandas going to the simulator
+def _load_app(sim):
+    warnings.filterwarnings("ignore")
+    logging.disable(logging.WARNING)
+    import mysnowsight
+    pool = mysnowsight.SnowflakeConnectionPool(
+        connect=lambda account, role, warehouse, database, schema, user, password: sim.connect(
+            account=account, role=role, warehouse=warehouse, database=database, schema=schema, user=user, password=password),
+        telemetry=mysnowsight.QueryTelemetry())
+    mysnowsight.get_connection_pool = lambda: pool
+    mysnowsight.write_pandas = snowflake_sim.write_pandas
+    return mysnowsight
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def bench_queries(app, sim, queries, rows=1000):
+    engine = app.AsyncQueryEngine(SOURCE_CREDS, max_sessions=8)
+    statements = [f"SELECT SEQ4() AS SEQ FROM TABLE(GENERATOR(ROWCOUNT => {rows + i}))" for i in range(queries)]
+    jobs = list(engine.run(statements))
+    return {"units": queries, "unit": "queries", "latencies": [job.elapsed for job in jobs],
+            "errors": sum(job.error is not None for job in jobs)}
+
+
+def bench_load(app, sim, rows, chunk_rows=100000):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory(prefix="mysnowsight_bench_") as scratch:
+        path = pathlib.Path(scratch) / "data.csv"
+        pd.DataFrame({"ID": np.arange(rows), "AMOUNT": rng.normal(100, 25, rows).round(2),
+                      "CATEGORY": rng.choice(["A", "B", "C", "D"], rows),
+                      "CREATED": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 86400 * 365, rows), unit="s")
+                      }).to_csv(path, index=False)
+        marks = [time.monotonic()]
+        with app.get_connection_pool().connection(*DEST_CREDS) as conn:
+            with open(path, "rb") as source:
+                specs = app.infer_load_schema(app.read_file_preview(source, "csv", nrows=app.LOAD_SAMPLE_ROWS)).to_dict("records")
+                conn.cursor().execute(app.load_table_sql(specs, "DST", "PUBLIC", "BENCH_LOAD"))
+                chunks = (app.apply_load_dtypes(chunk, specs) for chunk in app.iter_file_chunks(source, "csv", chunk_rows))
+                stats = app.bulk_load_chunks(conn, chunks, "BENCH_LOAD", "DST", "PUBLIC", auto_create_table=False,
+                                             on_progress=lambda stats: marks.append(time.monotonic()))
+    loaded = sim.tables["DST.PUBLIC.BENCH_LOAD"].num_rows
+    return {"units": stats["rows"], "unit": "rows", "latencies": list(np.diff(marks)),
+            "errors": int(loaded != rows)}
+
+
+def bench_replicate(app, sim, tables, rows=200000, mode="stream"):
+    for i in range(tables):
+        sim.create_table(f"SRC.PUBLIC.T{i:03d}", pa.table({"ID": np.arange(rows), "VAL": np.arange(rows) * 0.5}))
+    listing = [{"name": f"T{i:03d}", "rows": rows, "bytes": rows * 16} for i in range(tables)]
+    progress = app.replicate_tables(SOURCE_CREDS, DEST_CREDS, listing, "SRC", "PUBLIC", "DST", "PUBLIC", workers=4,
+                                    copy_table=app.REPLICATION_COPIES[mode])
+    return {"units": sum(item["rows"] for item in progress), "unit": "rows",
+            "latencies": [item["finished"] - item["started"] for item in progress if item["started"]],
+            "errors": sum(item["status"] != "done" for item in progress)}
+
+
+SCENARIOS = {
+    "queries-10": (bench_queries, {"queries": 10}),
+    "queries-100": (bench_queries, {"queries": 100}),
+    "queries-500": (bench_queries, {"queries": 500}),
+    "load-100k": (bench_load, {"rows": 100000}),
+    "load-1m": (bench_load, {"rows": 1000000}),
+    "replicate-4": (bench_replicate, {"tables": 4}),
+    "replicate-16": (bench_replicate, {"tables": 16}),
+    "replicate-unload-4": (bench_replicate, {"tables": 4, "mode": "unload"}),
+    "replicate-unload-16": (bench_replicate, {"tables": 16, "mode": "unload"}),
+    "replicate-clone-16": (bench_replicate, {"tables": 16, "mode": "clone"}),
+}
+
+
+# Child process: run one scenario and print its result as one JSON line
+def run_scenario(name, sim_options):
+    sim = snowflake_sim.SimulatedSnowflake(**sim_options)
+    app = _load_app(sim)
+    bench, kwargs = SCENARIOS[name]
+    started = time.monotonic()
+    result = bench(app, sim, **kwargs)
+    elapsed = time.monotonic() - started
+    latencies = result.pop("latencies")
+    result.update(scenario=name, elapsed_s=elapsed, throughput=result["units"] / elapsed if elapsed else 0.0,
+                  p50_s=_percentile(latencies, 50), p99_s=_percentile(latencies, 99),
+                  peak_rss_bytes=app._peak_rss_bytes(), sessions=sim.sessions, statements=sim.statements,
+                  peak_running=sim.peak_running, queued_s=sim.queued_time)
+    print(json.dumps(result))
+
+
+def _spawn(name, sim_options):
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-scenario", name, "--sim", json.dumps(sim_options)],
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"scenario": name, "failed": completed.stderr.strip().splitlines()[-1:] or ["no output"]}
+    return json.loads(lines[-1])
+
+
+# Regressions of `result` against `baseline`: lower throughput, higher p99 latency or peak RSS
+def compare(result, baseline, tolerance):
+    problems = []
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        problems.append(f"throughput {result['throughput']:,.1f} < {baseline['throughput']:,.1f} {result['unit']}/s")
+    if result["p99_s"] > baseline["p99_s"] * (1 + tolerance) and result["p99_s"] - baseline["p99_s"] > 0.01:
+        problems.append(f"p99 {result['p99_s']:.3f}s > {baseline['p99_s']:.3f}s")
+    if result["peak_rss_bytes"] > baseline["peak_rss_bytes"] * (1 + tolerance):
+        problems.append(f"peak RSS {result['peak_rss_bytes'] / 2**20:,.0f}MB > {baseline['peak_rss_bytes'] / 2**20:,.0f}MB")
+    if result["errors"] > baseline["errors"]:
+        problems.append(f"{result['errors']} errors (baseline {baseline['errors']})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline MYSNOWSIGHT benchmarks against a simulated Snowflake")
+    parser.add_argument("scenarios", nargs="*", default=["*"], help="scenario names or globs (default: all)")
+    parser.add_argument("--baselines", default=str(BASELINES), help="baseline file")
+    parser.add_argument("--update-baselines", action="store_true", help="store this run's results as the baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (default 0.25)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of simulated statements that fail")
+    parser.add_argument("--latency", type=float, default=SIM_DEFAULTS["statement_latency"], help="simulated seconds per statement")
+    parser.add_argument("--concurrency", type=int, default=SIM_DEFAULTS["max_concurrency"], help="simulated warehouse concurrency")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--sim", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario(args.run_scenario, json.loads(args.sim))
+        return 0
+
+    sim_options = dict(SIM_DEFAULTS, statement_latency=args.latency, max_concurrency=args.concurrency, failure_rate=args.failure_rate)
+    names = [name for name in SCENARIOS if any(fnmatch.fnmatch(name, pattern) for pattern in args.scenarios)]
+    baselines_path = pathlib.Path(args.baselines)
+    baselines = json.loads(baselines_path.read_text()) if baselines_path.exists() else {}
+    results, regressions = {}, 0
+    print(f"{'scenario':<20} {'throughput':>16} {'p50':>9} {'p99':>9} {'peak RSS':>10} {'errors':>6}  vs baseline")
+    for name in names:
+        result = _spawn(name, sim_options)
+        if "failed" in result:
+            print(f"{name:<20} FAILED: {result['failed'][0]}")
+            regressions += 1
+            continue
+        results[name] = result
+        problems = compare(result, baselines[name], args.tolerance) if name in baselines and not args.update_baselines else []
+        regressions += bool(problems)
+        status = "REGRESSION: " + "; ".join(problems) if problems else ("ok" if name in baselines else "no baseline")
+        print(f"{name:<20} {result['throughput']:>10,.1f} {result['unit'] + '/s':<5} {result['p50_s']:>8.3f}s {result['p99_s']:>8.3f}s "
+              f"{result['peak_rss_bytes'] / 2**20:>8,.0f}MB {result['errors']:>6}  {status}")
+
+    if args.update_baselines:
+        baselines.update(results)
+        baselines_path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baselines written to {baselines_path}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
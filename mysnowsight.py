@@ -1,16 +1,34 @@
+import time
+_RUN_STARTED = time.perf_counter()
 import re
 import streamlit as st
 import pandas as pd
-import snowflake.connector
-from snowflake.connector.pandas_tools import write_pandas
-import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow.csv as pa_csv
 from datetime import datetime
 import os
+import io
+import sys
+import random
 import pathlib
+import tempfile
+import shutil
+import atexit
+import gzip
+import uuid
 import textwrap
-from PIL import Image
-import google.generativeai as genai
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import warnings
+import functools
+import importlib
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 st.set_page_config(
   page_title="MYSNOWSIGHT",
@@ -19,7 +37,27 @@ st.set_page_config(
   initial_sidebar_state="expanded",
 ) 
 
-tab1, tab2, tab3 , tab4,tab5,tab6 = st.tabs(["PARALLEL EXECUTE", "LOAD FILE", "DOCUMENT AI", "GENERATE DDL","REPLICATE DATABASE","TEST DATA GENERATOR"])
+
+# Start-up and rerun timings for the whole process: the first run's duration (cold start), the
+# last reruns per tool and how long each deferred import took the first time it was needed
+@st.cache_resource
+def _app_timings():
+    return {"cold_start_s": None, "runs": deque(maxlen=200), "imports": {}}
+
+
+# Import a heavy module the first time a tool needs it instead of on every app start
+def _import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    _app_timings()["imports"][name] = time.perf_counter() - started
+    return module
+
+
+# Only the selected tool's code runs on a rerun; st.tabs would run all six every time
+TOOLS = ["PARALLEL EXECUTE", "LOAD FILE", "DOCUMENT AI", "GENERATE DDL","REPLICATE DATABASE","TEST DATA GENERATOR"]
+tool = st.radio("Tool", TOOLS, horizontal=True, label_visibility="collapsed", key="tool")
 
 # Sidebar for Snowflake credentials
 with st.sidebar:
@@ -34,19 +72,567 @@ with st.sidebar:
     password = st.sidebar.text_input("Password", type="password")	
 
 
-# Create a Snowflake connection function
+# Open a raw Snowflake session (no UI side effects, used by the connection pool)
+def _connect_snowflake(account, role, warehouse, database, schema, user, password):
+    return _import("snowflake.connector").connect(
+        account=account,
+        role=role,
+        warehouse=warehouse,
+        database=database,
+        schema=schema,
+        user=user,
+        password=password,
+        client_session_keep_alive=True
+    )
+
+
+# snowflake.connector.pandas_tools.write_pandas, imported on first use
+def write_pandas(*args, **kwargs):
+    return _import("snowflake.connector.pandas_tools").write_pandas(*args, **kwargs)
+
+
+# Timing breakdown of every statement run through a pooled session. Client-side timings (session
+# acquire, submit, fetch, rows) are recorded by the connection/cursor wrappers below; queued, compile
+# and execute times and bytes scanned are filled in later from QUERY_HISTORY_BY_SESSION.
+class QueryTelemetry:
+    TIMINGS = ["acquire_s", "submit_s", "queued_s", "compile_s", "execute_s", "fetch_s", "elapsed_s"]
+
+    def __init__(self, max_records=20000):
+        self.max_records = max_records
+        self._records = OrderedDict()
+        self._by_query_id = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start(self, conn, sql, acquire_s=None):
+        record = {"id": None, "started_at": datetime.now().isoformat(timespec="milliseconds"),
+                  "account": conn.account, "user": conn.user, "session_id": conn.session_id,
+                  "query_id": None, "kind": (sql.split(None, 1) or [""])[0].upper(), "statement": sql[:300],
+                  "acquire_s": acquire_s, "submit_s": None, "queued_s": None, "compile_s": None, "execute_s": None,
+                  "fetch_s": 0.0, "elapsed_s": None, "rows": None, "bytes_scanned": None, "error": None,
+                  "_started": time.monotonic()}
+        with self._lock:
+            record["id"] = self._next_id
+            self._next_id += 1
+            self._records[record["id"]] = record
+            while len(self._records) > self.max_records:
+                _, old = self._records.popitem(last=False)
+                self._by_query_id.pop(old["query_id"], None)
+        return record
+
+    def submitted(self, record, query_id, error=None):
+        with self._lock:
+            record["submit_s"] = time.monotonic() - record["_started"]
+            record["elapsed_s"] = record["submit_s"]
+            record["query_id"] = query_id
+            record["error"] = error
+            if query_id:
+                self._by_query_id[query_id] = record
+
+    def lookup(self, query_id):
+        with self._lock:
+            return self._by_query_id.get(query_id)
+
+    def fetched(self, record, seconds, rows=None):
+        if record is None:
+            return
+        with self._lock:
+            record["fetch_s"] += seconds
+            if rows is not None and rows >= 0:
+                record["rows"] = rows
+            record["elapsed_s"] = time.monotonic() - record["_started"]
+
+    def record_fetch(self, query_id, seconds):
+        self.fetched(self.lookup(query_id), seconds)
+
+    # Fill in server-side timings from INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION for the records of
+    # `conn`'s account/user that don't have them yet; returns how many records were updated
+    def enrich(self, conn):
+        with self._lock:
+            sessions = {}
+            for record in self._records.values():
+                if record["query_id"] and record["execute_s"] is None and record["account"] == conn.account and record["user"] == conn.user:
+                    sessions.setdefault(record["session_id"], {})[record["query_id"]] = record
+        updated = 0
+        cursor = conn.cursor()
+        try:
+            for session_id, records in sessions.items():
+                cursor.execute(f"""SELECT QUERY_ID, QUEUED_PROVISIONING_TIME + QUEUED_REPAIR_TIME + QUEUED_OVERLOAD_TIME,
+                                          COMPILATION_TIME, EXECUTION_TIME, BYTES_SCANNED
+                                   FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(SESSION_ID => {int(session_id)}, RESULT_LIMIT => 10000))
+                                   WHERE EXECUTION_STATUS IN ('SUCCESS', 'FAILED_WITH_ERROR', 'FAILED_WITH_INCIDENT')""")
+                with self._lock:
+                    for query_id, queued_ms, compile_ms, execute_ms, bytes_scanned in cursor.fetchall():
+                        record = records.get(query_id)
+                        if record is not None:
+                            record["queued_s"] = (queued_ms or 0) / 1000
+                            record["compile_s"] = (compile_ms or 0) / 1000
+                            record["execute_s"] = (execute_ms or 0) / 1000
+                            record["bytes_scanned"] = bytes_scanned
+                            updated += 1
+        finally:
+            cursor.close()
+        return updated
+
+    # Whether a record was made by `account`/`user` (no filter when both are None). The connector keeps
+    # only the account locator, so a region or cloud suffix on `account` is ignored.
+    @staticmethod
+    def _owned_by(record, account, user):
+        if account is None and user is None:
+            return True
+        return ((record["account"] or "").split(".")[0].lower() == (account or "").split(".")[0].lower()
+                and (record["user"] or "").upper() == (user or "").upper())
+
+    def records(self, account=None, user=None):
+        with self._lock:
+            return [{k: v for k, v in record.items() if not k.startswith("_")} for record in self._records.values()
+                    if self._owned_by(record, account, user)]
+
+    # p50/p90/p99/max of every timing (seconds), rows and bytes scanned
+    def summary(self, account=None, user=None):
+        df = pd.DataFrame(self.records(account, user), columns=["id"] + self.TIMINGS + ["rows", "bytes_scanned"])
+        if df.empty:
+            return df
+        metrics = df[self.TIMINGS + ["rows", "bytes_scanned"]].apply(pd.to_numeric, errors="coerce")
+        summary = metrics.quantile([0.5, 0.9, 0.99]).T
+        summary.columns = ["p50", "p90", "p99"]
+        summary["max"] = metrics.max()
+        summary["count"] = metrics.count()
+        return summary
+
+    # Write the records (all, or only `account`/`user`'s) to APP_DIR/telemetry as JSON lines or Parquet;
+    # returns the file's path
+    def export(self, fmt="jsonl", account=None, user=None):
+        path = APP_DIR / "telemetry" / f"telemetry-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        records = self.records(account, user)
+        if fmt == "parquet":
+            pq.write_table(pa.Table.from_pylist(records), path)
+        else:
+            with open(path, "w", encoding="utf-8") as out:
+                for record in records:
+                    out.write(json.dumps(record, default=str) + "\n")
+        return path
+
+    def clear(self, account=None, user=None):
+        with self._lock:
+            for record_id, record in list(self._records.items()):
+                if self._owned_by(record, account, user):
+                    del self._records[record_id]
+                    self._by_query_id.pop(record["query_id"], None)
+
+
+@st.cache_resource
+def get_query_telemetry():
+    return QueryTelemetry()
+
+
+# What the pool hands out: the real connection with cursor() returning a recording cursor. Everything
+# else is passed through, so it works anywhere a connector connection does (write_pandas included).
+# Statements that leave state behind on the session: current role/warehouse/database, variables,
+# session parameters or an open transaction (a procedure can do any of these)
+_SQL_SESSION_CHANGE = re.compile(r"^\s*(?:(?:--|//)[^\n]*\n\s*|/\*.*?\*/\s*)*(USE|SET|UNSET|BEGIN|START|COMMIT|ROLLBACK|CALL|ALTER\s+SESSION)\b",
+                                 re.IGNORECASE | re.DOTALL)
+
+
+# session_changed tells the pool not to hand the session to anyone else once it's checked in
+class _TelemetryConnection:
+    def __init__(self, conn, telemetry, acquire_s):
+        self.raw = conn
+        self.telemetry = telemetry
+        self.acquire_s = acquire_s
+        self.session_changed = False
+
+    def cursor(self, *args, **kwargs):
+        return _TelemetryCursor(self.raw.cursor(*args, **kwargs), self)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self.raw.__exit__(*exc)
+
+
+class _TelemetryCursor:
+    def __init__(self, cursor, conn):
+        self.raw = cursor
+        self.conn = conn
+        self.record = None
+
+    def _start(self, command):
+        if _SQL_SESSION_CHANGE.match(str(command)):
+            self.conn.session_changed = True
+        # The session acquire time is charged to the first statement run on the checkout
+        acquire_s, self.conn.acquire_s = self.conn.acquire_s, None
+        self.record = self.conn.telemetry.start(self.conn.raw, str(command), acquire_s)
+
+    def execute(self, command, *args, **kwargs):
+        self._start(command)
+        try:
+            result = self.raw.execute(command, *args, **kwargs)
+        except Exception as e:
+            self.conn.telemetry.submitted(self.record, getattr(self.raw, "sfqid", None), error=str(e))
+            raise
+        self.conn.telemetry.submitted(self.record, self.raw.sfqid)
+        self.conn.telemetry.fetched(self.record, 0.0, self.raw.rowcount)
+        return self if result is self.raw else result
+
+    def execute_async(self, command, *args, **kwargs):
+        self._start(command)
+        try:
+            result = self.raw.execute_async(command, *args, **kwargs)
+        except Exception as e:
+            self.conn.telemetry.submitted(self.record, None, error=str(e))
+            raise
+        self.conn.telemetry.submitted(self.record, self.raw.sfqid)
+        return result
+
+    def get_results_from_sfqid(self, sfqid):
+        self.record = self.conn.telemetry.lookup(sfqid)
+        started = time.monotonic()
+        self.raw.get_results_from_sfqid(sfqid)
+        self.conn.telemetry.fetched(self.record, time.monotonic() - started, self.raw.rowcount)
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.monotonic()
+        result = getattr(self.raw, method)(*args, **kwargs)
+        self.conn.telemetry.fetched(self.record, time.monotonic() - started)
+        return result
+
+    def fetchone(self):
+        return self._timed("fetchone")
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed("fetchmany", *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed("fetchall")
+
+    def fetch_pandas_all(self, *args, **kwargs):
+        return self._timed("fetch_pandas_all", *args, **kwargs)
+
+    def fetch_arrow_all(self, *args, **kwargs):
+        return self._timed("fetch_arrow_all", *args, **kwargs)
+
+    def get_result_batches(self):
+        return self._timed("get_result_batches")
+
+    def _timed_batches(self, method, *args, **kwargs):
+        batches = getattr(self.raw, method)(*args, **kwargs)
+        while True:
+            started = time.monotonic()
+            try:
+                batch = next(batches)
+            except StopIteration:
+                return
+            finally:
+                self.conn.telemetry.fetched(self.record, time.monotonic() - started)
+            yield batch
+
+    def fetch_arrow_batches(self, *args, **kwargs):
+        return self._timed_batches("fetch_arrow_batches", *args, **kwargs)
+
+    def fetch_pandas_batches(self, *args, **kwargs):
+        return self._timed_batches("fetch_pandas_batches", *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.raw.close()
+
+
+# A pooled session plus the bookkeeping the pool needs to hand it out again
+class _PooledSession:
+    def __init__(self, key, conn, database, schema):
+        self.key = key
+        self.conn = conn
+        self.database = database
+        self.schema = schema
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+
+
+# Process-wide pool of warm Snowflake sessions shared by every tab, rerun and worker thread.
+# Sessions are keyed by account/role/warehouse/user plus a digest of the password, so a wrong
+# password never gets someone else's session. Database/schema are switched with USE on checkout;
+# a session that ran anything else that changes session state is closed on checkin, not reused.
+# Raised when the pool has no session to lend within the timeout (nothing was run on Snowflake yet)
+class PoolTimeoutError(TimeoutError):
+    pass
+
+
+class SnowflakeConnectionPool:
+    def __init__(self, max_size=16, idle_timeout=900, health_check_interval=120, connect=None, telemetry=None):
+        self.max_size = max_size
+        # Sessions are always handed out wrapped so session changes are seen; without telemetry nothing is kept
+        self.telemetry = telemetry if telemetry is not None else QueryTelemetry(max_records=0)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect = connect or _connect_snowflake
+        self._lock = threading.Condition()
+        self._idle = {}
+        self._leased = {}
+        self._opening = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.evictions = 0
+        self.failed_health_checks = 0
+        reaper = threading.Thread(target=self._reap_forever, name="snowflake-pool-reaper", daemon=True)
+        reaper.start()
+
+    @staticmethod
+    def pool_key(account, role, warehouse, user, password):
+        digest = hashlib.sha256((password or "").encode("utf-8")).hexdigest()[:16]
+        return ((account or "").lower(), (role or "").upper(), (warehouse or "").upper(), (user or "").upper(), digest)
+
+    def _size_locked(self):
+        return len(self._leased) + self._opening + sum(len(v) for v in self._idle.values())
+
+    def _expired_locked(self):
+        now = time.monotonic()
+        expired = []
+        for key in list(self._idle):
+            keep = []
+            for session in self._idle[key]:
+                (expired if now - session.last_used > self.idle_timeout else keep).append(session)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        self.evictions += len(expired)
+        return expired
+
+    def _pop_lru_idle_locked(self):
+        sessions = [s for v in self._idle.values() for s in v]
+        if not sessions:
+            return None
+        victim = min(sessions, key=lambda s: s.last_used)
+        self._idle[victim.key].remove(victim)
+        if not self._idle[victim.key]:
+            del self._idle[victim.key]
+        self.evictions += 1
+        return victim
+
+    @staticmethod
+    def _close(sessions):
+        for session in sessions:
+            try:
+                session.conn.close()
+            except Exception:
+                pass
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(60)
+            with self._lock:
+                expired = self._expired_locked()
+                if expired:
+                    self._lock.notify_all()
+            self._close(expired)
+
+    def _healthy(self, session):
+        if session.conn.is_closed():
+            return False
+        if time.monotonic() - session.last_checked < self.health_check_interval:
+            return True
+        try:
+            cursor = session.conn.cursor()
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            session.last_checked = time.monotonic()
+            return True
+        except Exception:
+            return False
+
+    # Borrow a session; blocks up to `timeout` seconds when the pool is at max_size
+    def checkout(self, account, role, warehouse, database, schema, user, password, timeout=60):
+        key = self.pool_key(account, role, warehouse, user, password)
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            session = None
+            waited_since = None
+            with self._lock:
+                while True:
+                    expired = self._expired_locked()
+                    if expired:
+                        break
+                    if self._idle.get(key):
+                        session = self._idle[key].pop()
+                        if not self._idle[key]:
+                            del self._idle[key]
+                        self.hits += 1
+                        break
+                    if self._size_locked() < self.max_size:
+                        self._opening += 1
+                        self.misses += 1
+                        break
+                    # Pool is full: make room by dropping the least recently used idle session
+                    expired = [self._pop_lru_idle_locked()] if self._idle else []
+                    if expired:
+                        break
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                        self.waits += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.wait_time += time.monotonic() - waited_since
+                        raise PoolTimeoutError(f"No Snowflake session available within {timeout} seconds (pool size {self.max_size})")
+                    self._lock.wait(remaining)
+                if waited_since is not None:
+                    self.wait_time += time.monotonic() - waited_since
+            if expired:
+                self._close(expired)
+                continue
+
+            if session is None:
+                try:
+                    conn = self.connect(account, role, warehouse, database, schema, user, password)
+                except Exception:
+                    with self._lock:
+                        self._opening -= 1
+                        self._lock.notify()
+                    raise
+                session = _PooledSession(key, conn, database, schema)
+                with self._lock:
+                    self._opening -= 1
+                    self._leased[id(conn)] = session
+                return self._wrap(conn, started)
+
+            if not self._healthy(session):
+                with self._lock:
+                    self.failed_health_checks += 1
+                    self._lock.notify()
+                self._close([session])
+                continue
+            with self._lock:
+                self._leased[id(session.conn)] = session
+            try:
+                self._use(session, database, schema)
+            except Exception:
+                self.checkin(session.conn, discard=True)
+                raise
+            return self._wrap(session.conn, started)
+
+    def _wrap(self, conn, started):
+        return _TelemetryConnection(conn, self.telemetry, time.monotonic() - started)
+
+    # Switch to the requested database/schema; the connector tracks the session's current ones, which
+    # also catches USE statements run by whoever borrowed the session before
+    @staticmethod
+    def _use(session, database, schema):
+        def same(current, wanted):
+            return (current or "").strip('"').upper() == wanted.strip('"').upper()
+
+        cursor = session.conn.cursor()
+        try:
+            if database and not same(getattr(session.conn, "database", session.database), database):
+                cursor.execute(f"USE DATABASE {database}")
+            if schema and not same(getattr(session.conn, "schema", session.schema), schema):
+                cursor.execute(f"USE SCHEMA {schema}")
+            session.database, session.schema = database, schema
+        finally:
+            cursor.close()
+
+    # Return a borrowed session; broken, discarded or state-changed sessions are closed instead of reused
+    def checkin(self, conn, discard=False):
+        if isinstance(conn, _TelemetryConnection):
+            discard = discard or conn.session_changed
+            conn = conn.raw
+        with self._lock:
+            session = self._leased.pop(id(conn), None)
+            reusable = session is not None and not discard and not conn.is_closed()
+            if reusable:
+                session.last_used = time.monotonic()
+                self._idle.setdefault(session.key, []).append(session)
+            self._lock.notify()
+        if not reusable:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self, account, role, warehouse, database, schema, user, password, timeout=60):
+        conn = self.checkout(account, role, warehouse, database, schema, user, password, timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    # Borrow one session per entry of `creds` (each account, role, warehouse, database, schema, user,
+    # password) all or nothing: when a later one isn't free right away, the ones already held are handed
+    # back before waiting again, so callers needing several sessions never sit on one waiting for another
+    @contextmanager
+    def connections(self, *creds, timeout=60):
+        deadline = time.monotonic() + timeout
+        while True:
+            conns = [self.checkout(*creds[0], timeout=max(deadline - time.monotonic(), 0))]
+            try:
+                for more in creds[1:]:
+                    conns.append(self.checkout(*more, timeout=0))
+                break
+            except PoolTimeoutError:
+                for conn in conns:
+                    self.checkin(conn)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"No {len(creds)} Snowflake sessions available together within {timeout} seconds "
+                                       f"(pool size {self.max_size})")
+                with self._lock:
+                    self._lock.wait(min(remaining, random.uniform(0.05, 0.2)))
+            except Exception:
+                for conn in conns:
+                    self.checkin(conn)
+                raise
+        try:
+            yield conns
+        finally:
+            for conn in conns:
+                self.checkin(conn)
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "open": self._size_locked(),
+                "idle": sum(len(v) for v in self._idle.values()),
+                "in_use": len(self._leased),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "waits": self.waits,
+                "wait_time_s": self.wait_time,
+                "evictions": self.evictions,
+                "failed_health_checks": self.failed_health_checks,
+            }
+
+
+@st.cache_resource
+def get_connection_pool():
+    return SnowflakeConnectionPool(telemetry=get_query_telemetry())
+
+
+# Create a Snowflake connection function (borrowed from the pool; hand it back with get_connection_pool().checkin)
 def create_snowflake_connection(account, role, warehouse, database, schema, user, password):
+    conn = None
     try:
-        conn = snowflake.connector.connect(
-            account=account,
-            role=role,
-            warehouse=warehouse,
-            database=database,
-            schema=schema,
-            user=user,
-            password=password,
-            client_session_keep_alive=True
-        )
+        conn = get_connection_pool().checkout(account, role, warehouse, database, schema, user, password)
         st.toast("Connection to Snowflake successfully!", icon='🎉')
         time.sleep(.5)
         st.balloons()
@@ -54,36 +640,2653 @@ def create_snowflake_connection(account, role, warehouse, database, schema, user
         st.error(f"Error connecting to Snowflake: {str(e)}")    
     return conn
 
-with tab1:
 
-                # Function to execute queries in parallel
-                def execute_queries(queries):
-                    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
-                       
-                        results = list(executor.map(execute_single_query, queries))
-                        
-                    return results
+# Borrow a pooled session for a with-block; yields None when Snowflake can't be reached
+@contextmanager
+def snowflake_session(account, role, warehouse, database, schema, user, password):
+    pool = get_connection_pool()
+    conn = None
+    try:
+        conn = pool.checkout(account, role, warehouse, database, schema, user, password)
+    except Exception as e:
+        st.error(f"Error connecting to Snowflake: {str(e)}")
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            pool.checkin(conn)
+
+
+_SQL_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+_SQL_NUMBER = re.compile(r"[0-9]+(\.[0-9]*)?([eE][+-]?[0-9]+)?")
+
+
+# Scan a quoted token starting at i; doubled quotes (and backslashes in strings) escape
+def _scan_quoted(text, i, quote):
+    j = i + 1
+    while j < len(text):
+        if quote == "'" and text[j] == "\\":
+            j += 2
+            continue
+        if text[j] == quote:
+            if text.startswith(quote * 2, j):
+                j += 2
+                continue
+            return j + 1
+        j += 1
+    return len(text)
+
+
+# Tokenize SQL into (kind, value, start, end); kinds: word, ident, string, dollar, comment, number, semicolon, punct
+def _sql_tokens(text):
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            i += 1
+        elif text.startswith("--", i) or text.startswith("//", i):
+            j = text.find("\n", i)
+            j = n if j < 0 else j
+            yield ("comment", text[i:j], i, j)
+            i = j
+        elif text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            j = n if j < 0 else j + 2
+            yield ("comment", text[i:j], i, j)
+            i = j
+        elif text.startswith("$$", i):
+            j = text.find("$$", i + 2)
+            j = n if j < 0 else j + 2
+            yield ("dollar", text[i:j], i, j)
+            i = j
+        elif c == "'":
+            j = _scan_quoted(text, i, "'")
+            yield ("string", text[i:j], i, j)
+            i = j
+        elif c == '"':
+            j = _scan_quoted(text, i, '"')
+            yield ("ident", text[i + 1:j - 1].replace('""', '"'), i, j)
+            i = j
+        elif c == ";":
+            yield ("semicolon", c, i, i + 1)
+            i += 1
+        else:
+            m = _SQL_WORD.match(text, i) or _SQL_NUMBER.match(text, i)
+            if m:
+                yield ("word" if m.re is _SQL_WORD else "number", m.group(0), i, m.end())
+                i = m.end()
+            else:
+                yield ("punct", c, i, i + 1)
+                i += 1
+
+
+# Split a script on top-level semicolons only: quotes, $$ bodies, comments and
+# DECLARE/BEGIN ... END / CASE ... END blocks are kept whole
+def split_sql_statements(text):
+    tokens = [t for t in _sql_tokens(text) if t[0] != "comment"]
+    statements = []
+    blocks = []
+    start = 0
+    has_code = False
+    for pos, (kind, value, begin, end) in enumerate(tokens):
+        if kind == "semicolon":
+            if not blocks:
+                if has_code:
+                    statements.append(text[start:begin].strip())
+                start, has_code = end, False
+            continue
+        has_code = True
+        if kind != "word":
+            continue
+        word = value.upper()
+        following = tokens[pos + 1][1].upper() if pos + 1 < len(tokens) else ";"
+        if word == "DECLARE":
+            blocks.append("DECLARE")
+        elif word == "BEGIN":
+            # BEGIN [TRANSACTION|WORK|NAME ...] starts a transaction, not a block
+            if following in (";", "TRANSACTION", "WORK", "NAME"):
+                continue
+            if blocks and blocks[-1] == "DECLARE":
+                blocks[-1] = "BEGIN"
+            else:
+                blocks.append("BEGIN")
+        elif word == "CASE":
+            # The CASE of END CASE closes the block rather than opening another one
+            if pos and tokens[pos - 1][1].upper() == "END":
+                continue
+            blocks.append("CASE")
+        elif word == "END" and following not in ("IF", "FOR", "LOOP", "WHILE", "REPEAT"):
+            if blocks:
+                blocks.pop()
+    if has_code:
+        statements.append(text[start:].strip())
+    return statements
+
+
+# Any other verb (USE, SET, transactions, CALL, EXECUTE IMMEDIATE, GRANT, PUT ...) is treated as a barrier
+_SQL_WRITE_VERBS = {"INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "CREATE", "DROP", "ALTER", "COPY"}
+_SQL_READ_ONLY_VERBS = {"SELECT", "WITH", "SHOW", "DESC", "DESCRIBE", "EXPLAIN", "LIST", "LS", "VALUES"}
+_SQL_OBJECT_TYPES = {"TABLE", "VIEW", "PROCEDURE", "FUNCTION", "SEQUENCE", "STAGE", "STREAM", "TASK",
+                     "PIPE", "FORMAT", "TAG", "POLICY", "ALERT", "SCHEMA", "DATABASE", "WAREHOUSE", "ROLE", "USER"}
+# Words that open a parenthesised subquery or list rather than a function call
+_SQL_NON_FUNCTION_WORDS = {"IN", "EXISTS", "FROM", "JOIN", "AS", "ON", "WHERE", "AND", "OR", "NOT", "SELECT",
+                           "VALUES", "ANY", "ALL", "SOME", "USING", "INTO", "UNION", "EXCEPT", "MINUS",
+                           "INTERSECT", "THEN", "ELSE", "WHEN", "RETURN", "LATERAL"}
+
+
+# Read a possibly qualified object name starting at tokens[pos]; returns (name or None, next position)
+def _read_object_name(tokens, pos, database, schema):
+    parts = []
+    while pos < len(tokens):
+        kind, value = tokens[pos][0], tokens[pos][1]
+        if kind == "word":
+            parts.append(value.upper())
+        elif kind == "ident":
+            parts.append(value)
+        else:
+            break
+        pos += 1
+        if pos < len(tokens) and tokens[pos][1] == "." and tokens[pos][0] == "punct":
+            pos += 1
+            continue
+        break
+    if not parts:
+        return None, pos
+    if len(parts) == 1:
+        parts = [(database or "").upper(), (schema or "").upper()] + parts
+    elif len(parts) == 2:
+        parts = [(database or "").upper()] + parts
+    return ".".join(parts[-3:]), pos
+
+
+# Work out which tables a statement reads and writes; barrier statements (USE, SET, transactions,
+# procedure calls, unknown verbs) are ordered against everything else
+def statement_access(sql, database="", schema=""):
+    tokens = [t for t in _sql_tokens(sql) if t[0] not in ("comment", "string", "dollar")]
+    words = [t[1].upper() if t[0] == "word" else None for t in tokens]
+    reads, writes = set(), set()
+    verb = words[0] if words and words[0] else ""
+    barrier = verb not in _SQL_READ_ONLY_VERBS and verb not in _SQL_WRITE_VERBS
+
+    def name_after(pos, skip=()):
+        while pos < len(tokens) and words[pos] in skip:
+            pos += 1
+        if pos < len(tokens) and tokens[pos][0] == "punct":
+            return None
+        return _read_object_name(tokens, pos, database, schema)[0]
+
+    if verb in ("CREATE", "DROP", "ALTER"):
+        pos = 1
+        while pos < len(tokens) and words[pos] not in _SQL_OBJECT_TYPES:
+            if words[pos] == "SESSION":
+                barrier = True
+            pos += 1
+        if pos < len(tokens) and words[pos] in ("SCHEMA", "DATABASE", "WAREHOUSE", "ROLE", "USER"):
+            barrier = True
+        elif pos < len(tokens):
+            target = name_after(pos + 1, skip={"IF", "NOT", "EXISTS"})
+            if target:
+                writes.add(target)
+        else:
+            barrier = True
+    elif verb == "INSERT" or verb == "MERGE" or verb == "COPY":
+        for pos, word in enumerate(words):
+            if word == "INTO":
+                if pos + 1 < len(tokens) and tokens[pos + 1][1] == "@":
+                    continue
+                target = name_after(pos + 1)
+                if target:
+                    writes.add(target)
+    elif verb == "UPDATE":
+        target = name_after(1)
+        if target:
+            writes.add(target)
+    elif verb == "DELETE" or verb == "TRUNCATE":
+        target = name_after(1, skip={"FROM", "TABLE", "IF", "EXISTS"})
+        if target:
+            writes.add(target)
+
+    # Tables read through FROM / JOIN / USING / CLONE / LIKE, skipping function-call arguments
+    # such as EXTRACT(YEAR FROM ...) and names of CTEs defined in the statement
+    ctes = set()
+    parens = []
+    for pos, (kind, value, _, _) in enumerate(tokens):
+        if kind == "punct" and value == "(":
+            previous = words[pos - 1] if pos else None
+            parens.append(previous is not None and previous not in _SQL_NON_FUNCTION_WORDS)
+            if pos >= 2 and words[pos - 1] == "AS" and tokens[pos - 2][0] in ("word", "ident"):
+                ctes.add(_read_object_name(tokens, pos - 2, database, schema)[0])
+        elif kind == "punct" and value == ")":
+            if parens:
+                parens.pop()
+        elif words[pos] in ("FROM", "JOIN", "USING", "CLONE", "LIKE") and not (parens and parens[-1]):
+            # FROM a [AS] x, b y, ...
+            pos += 1
+            while pos < len(tokens) and words[pos] not in ("TABLE", "LATERAL") and tokens[pos][0] != "punct":
+                source, pos = _read_object_name(tokens, pos, database, schema)
+                if not source:
+                    break
+                reads.add(source)
+                if pos < len(tokens) and words[pos] == "AS":
+                    pos += 1
+                if pos < len(tokens) and tokens[pos][0] in ("word", "ident"):
+                    pos += 1
+                if pos < len(tokens) and tokens[pos][1] == ",":
+                    pos += 1
+                    continue
+                break
+    reads -= ctes
+    return {"kind": verb, "reads": reads, "writes": writes, "barrier": barrier}
+
+
+# Build the dependency graph for a script: a statement waits for every earlier statement it
+# conflicts with (write/read, read/write, write/write or a barrier); waves are DAG levels
+def plan_statements(statements, database="", schema=""):
+    plan = []
+    for index, sql in enumerate(statements):
+        access = statement_access(sql, database, schema)
+        depends_on = set()
+        for earlier in plan:
+            if (access["barrier"] or earlier["barrier"]
+                    or earlier["writes"] & (access["reads"] | access["writes"])
+                    or earlier["reads"] & access["writes"]):
+                depends_on.add(earlier["index"])
+        wave = 1 + max((plan[i]["wave"] for i in depends_on), default=0)
+        plan.append(dict(access, index=index, statement=sql, depends_on=depends_on, wave=wave))
+    return plan
+
+
+# Rows shown per page of a query result
+RESULT_PAGE_ROWS = 1000
+# Streamlit holds a download in memory, so only results up to this size (uncompressed) are offered
+# as browser downloads; bigger ones are exported to a file on the app host
+RESULT_DOWNLOAD_MAX_BYTES = 200 * 1024 * 1024
+
+
+def _format_bytes(num_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+
+# Concatenate Arrow tables whose integer widths may differ between Snowflake result chunks
+def _concat_arrow(tables):
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except TypeError:
+        return pa.concat_tables(tables)
+
+
+# Widen integer/float columns so every Snowflake result chunk fits the first chunk's schema
+def _spill_schema(schema):
+    fields = []
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            field = field.with_type(pa.int64())
+        elif pa.types.is_floating(field.type):
+            field = field.with_type(pa.float64())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+# Local directory of spilled query results: Arrow IPC streams written as the result batches arrive
+# and read back through memory maps. Finished files are kept LRU under a byte budget, so old spills
+# (and exports made from them) are deleted once the directory gets too big.
+class ResultSpill:
+    def __init__(self, parent, max_bytes=10 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        # Each process spills into its own directory under `parent`, removed when the process exits
+        pathlib.Path(parent).mkdir(parents=True, exist_ok=True)
+        self.root = pathlib.Path(tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=parent))
+        atexit.register(shutil.rmtree, self.root, ignore_errors=True)
+
+    def allocate(self, name, suffix=".arrows"):
+        return self.root / f"{name}-{uuid.uuid4().hex[:8]}{suffix}"
+
+    # Account for a finished file and evict the least recently used ones beyond the budget
+    def register(self, path):
+        with self._lock:
+            self._files[path] = path.stat().st_size
+            self._files.move_to_end(path)
+            held = sum(self._files.values())
+            while held > self.max_bytes and len(self._files) > 1:
+                old, size = self._files.popitem(last=False)
+                old.unlink(missing_ok=True)
+                held -= size
+                self.evictions += 1
+
+    def touch(self, path):
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+
+    def contains(self, path):
+        with self._lock:
+            return path in self._files
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "bytes": sum(self._files.values()), "max_bytes": self.max_bytes,
+                    "evictions": self.evictions}
+
+
+@st.cache_resource
+def get_result_spill():
+    return ResultSpill(APP_DIR / "spill")
+
+
+# A query result kept as Snowflake result batches: pages are downloaded as Arrow only when asked
+# for, while row and byte totals come from the batch metadata without fetching anything.
+# With a ResultSpill, results bigger than a page are instead streamed to a spill file by a background
+# thread as the batches download; pages and exports are then read zero-copy from its memory map.
+class ArrowResult:
+    def __init__(self, query_id, columns, batches, page_rows=RESULT_PAGE_ROWS):
+        self.query_id = query_id
+        self.columns = columns
+        self.page_rows = page_rows
+        self.pages = []
+        self.total_rows = sum(batch.rowcount for batch in batches)
+        self.total_bytes = sum(batch.uncompressed_size or 0 for batch in batches)
+        self.compressed_bytes = sum(batch.compressed_size or 0 for batch in batches)
+        self._batches = batches
+        self._next_batch = 0
+        self._pending = None
+        self._pending_offset = 0
+        self._lock = threading.Lock()
+        self.spill = None
+        self.spill_path = None
+        self.spill_error = None
+        self.spilled_rows = 0
+        self.spilled_bytes = 0
+        self.spill_done = False
+        self._spilled_chunks = 0
+        self._view_rows = 0
+        self._spill_cond = threading.Condition()
+        self._exports = {}
+        self._export_lock = threading.Lock()
+
+    @classmethod
+    def from_cursor(cls, cursor, page_rows=RESULT_PAGE_ROWS, spill=None):
+        columns = [col[0] for col in cursor.description]
+        result = cls(cursor.sfqid, columns, cursor.get_result_batches() or [], page_rows=page_rows)
+        if spill is not None and result.total_rows > page_rows:
+            result._start_spill(spill)
+        result.load_more()
+        return result
+
+    @property
+    def spilled(self):
+        return self.spill is not None
+
+    # False once the spill file was evicted; the result has to be queried again
+    @property
+    def available(self):
+        return not self.spilled or not self.spill_done or self.spill.contains(self.spill_path)
+
+    @property
+    def loaded_rows(self):
+        if self.spilled:
+            return self._view_rows
+        return sum(page.num_rows for page in self.pages)
+
+    # Bytes held in process memory; spilled pages live in the page cache behind the memory map
+    @property
+    def loaded_bytes(self):
+        return sum(page.nbytes for page in self.pages)
+
+    @property
+    def has_more(self):
+        return self.loaded_rows < self.total_rows
+
+    def _fetch(self, batch):
+        started = time.monotonic()
+        try:
+            return batch.to_arrow()
+        except NotImplementedError:
+            # JSON-format results can't be read as Arrow directly
+            return pa.Table.from_pandas(pd.DataFrame(list(batch), columns=self.columns), preserve_index=False)
+        finally:
+            get_query_telemetry().record_fetch(self.query_id, time.monotonic() - started)
+
+    def _start_spill(self, spill):
+        self.spill = spill
+        self.spill_path = spill.allocate(self.query_id or "result")
+        threading.Thread(target=self._spill_all, name=f"spill-{self.query_id}", daemon=True).start()
+
+    # Background thread: download every batch in order and append it to the spill file. Chunks are
+    # unbuffered writes, so readers can map the file while it grows and read the chunks counted so far.
+    def _spill_all(self):
+        writer = None
+        try:
+            with pa.OSFile(str(self.spill_path), "wb") as sink:
+                for batch in self._batches:
+                    table = self._fetch(batch)
+                    if writer is None:
+                        schema = _spill_schema(table.schema)
+                        writer = pa.ipc.new_stream(sink, schema)
+                    chunks = table.cast(schema).to_batches()
+                    for chunk in chunks:
+                        writer.write_batch(chunk)
+                    with self._spill_cond:
+                        self._spilled_chunks += len(chunks)
+                        self.spilled_rows += table.num_rows
+                        self.spilled_bytes = sink.tell()
+                        self._spill_cond.notify_all()
+                if writer is not None:
+                    writer.close()
+            self.spill.register(self.spill_path)
+        except Exception as e:
+            self.spill_error = str(e)
+            self.spill_path.unlink(missing_ok=True)
+        finally:
+            with self._spill_cond:
+                self.spill_done = True
+                self._spill_cond.notify_all()
+
+    # Block until `rows` rows are spilled (or the spill ended); returns the number of readable chunks
+    def _wait_spilled(self, rows):
+        with self._spill_cond:
+            self._spill_cond.wait_for(lambda: self.spill_done or self.spilled_rows >= rows)
+            return self._spilled_chunks
+
+    # Memory-mapped record batches of the spill file, up to `limit` rows
+    def _read_spilled(self, limit=None):
+        chunks = self._wait_spilled(self.total_rows if limit is None else limit)
+        if self.spill_done and not self.spill.contains(self.spill_path):
+            raise FileNotFoundError(f"Spilled result of query {self.query_id} was evicted; run the query again")
+        self.spill.touch(self.spill_path)
+        if chunks == 0:
+            return
+        reader = pa.ipc.open_stream(pa.memory_map(str(self.spill_path)))
+        remaining = self.total_rows if limit is None else limit
+        for _ in range(chunks):
+            if remaining <= 0:
+                break
+            chunk = reader.read_next_batch()
+            if chunk.num_rows > remaining:
+                chunk = chunk.slice(0, remaining)
+            remaining -= chunk.num_rows
+            yield chunk
+
+    # Download just enough result batches to fill the next page
+    def load_more(self):
+        if self.spilled:
+            self._wait_spilled(self._view_rows + self.page_rows)
+            if self.spill_error is None:
+                self._view_rows = min(self._view_rows + self.page_rows, self.total_rows)
+                return self.has_more
+            # Spilling failed: fall back to paging in memory
+            self.spill = None
+        with self._lock:
+            parts = []
+            needed = self.page_rows
+            while needed > 0:
+                if self._pending is None or self._pending_offset >= self._pending.num_rows:
+                    if self._next_batch >= len(self._batches):
+                        break
+                    self._pending = self._fetch(self._batches[self._next_batch])
+                    self._pending_offset = 0
+                    self._next_batch += 1
+                    continue
+                take = min(needed, self._pending.num_rows - self._pending_offset)
+                parts.append(self._pending.slice(self._pending_offset, take))
+                self._pending_offset += take
+                needed -= take
+            if parts:
+                self.pages.append(_concat_arrow(parts))
+            return self.has_more
+
+    def to_arrow(self):
+        if self.spilled and self.spill_error is None:
+            chunks = list(self._read_spilled(self._view_rows))
+            if chunks:
+                return pa.Table.from_batches(chunks)
+        if not self.pages:
+            return pa.table({col: pa.array([], pa.string()) for col in self.columns})
+        return _concat_arrow(self.pages)
+
+    # Every row as record batches: from the spill file when there is one, else by loading all pages
+    def iter_batches(self):
+        if self.spilled:
+            self._wait_spilled(self.total_rows)
+        if self.spilled and self.spill_error is None:
+            yield from self._read_spilled()
+            return
+        while self.has_more:
+            self.load_more()
+        for page in self.pages:
+            yield from page.to_batches()
+
+    # Write the whole result to a spill-directory file as Parquet or gzip-compressed CSV, batch by
+    # batch, without querying the warehouse again; returns the file's path
+    # Write the result as Parquet or gzipped CSV into the spill directory; the file is reused for this
+    # result and format until the spill evicts it
+    def export(self, fmt):
+        with self._export_lock:
+            spill = self.spill or get_result_spill()
+            path = self._exports.get(fmt)
+            if path is not None and spill.contains(path):
+                spill.touch(path)
+                return path
+            path = self._exports[fmt] = self._write_export(spill, fmt)
+            return path
+
+    def _write_export(self, spill, fmt):
+        path = spill.allocate(self.query_id or "result", suffix={"parquet": ".parquet", "csv.gz": ".csv.gz"}[fmt])
+        writer = None
+        try:
+            with (gzip.open(path, "wb", compresslevel=6) if fmt == "csv.gz" else open(path, "wb")) as out:
+                for chunk in self.iter_batches():
+                    if writer is None:
+                        schema = _spill_schema(chunk.schema)
+                        writer = pa_csv.CSVWriter(out, schema) if fmt == "csv.gz" else pq.ParquetWriter(out, schema)
+                    writer.write_table(pa.Table.from_batches([chunk]).cast(schema))
+                if writer is None:
+                    writer = pa_csv.CSVWriter(out, self.to_arrow().schema) if fmt == "csv.gz" else pq.ParquetWriter(out, self.to_arrow().schema)
+                writer.close()
+        except Exception:
+            path.unlink(missing_ok=True)
+            raise
+        spill.register(path)
+        return path
+
+
+# Functions/objects whose results change without any table being written
+_SQL_VOLATILE = re.compile(r"\b(CURRENT_\w+|SYSDATE|GETDATE|LOCALTIME|LOCALTIMESTAMP|SYSTIMESTAMP|RANDOM|RANDSTR|UUID_STRING|"
+                           r"SEQ[1248]|NORMAL|UNIFORM|ZIPF|RESULT_SCAN|LAST_QUERY_ID|INFORMATION_SCHEMA|ACCOUNT_USAGE|"
+                           r"READER_ACCOUNT_USAGE|ORGANIZATION_USAGE|SYSTEM\$\w+)\b")
+# Statements that change session state but not data
+_SQL_SESSION_VERBS = {"USE", "SET", "UNSET", "BEGIN", "START", "COMMIT", "ROLLBACK"}
+
+
+# Process-wide cache of read-only query results: LRU over a byte budget with a per-entry TTL.
+# Entries remember the tables they read and are dropped as soon as the app writes one of them.
+class QueryResultCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # Collapse whitespace/comments and upper-case unquoted words so trivially different texts share an entry
+    @staticmethod
+    def normalize(sql):
+        parts = []
+        for kind, value, _, _ in _sql_tokens(sql):
+            if kind == "comment" or kind == "semicolon":
+                continue
+            if kind == "word":
+                value = value.upper()
+            elif kind == "ident":
+                value = '"' + value.replace('"', '""') + '"'
+            parts.append(value)
+        return " ".join(parts)
+
+    @staticmethod
+    def cacheable(normalized_sql, access):
+        return access["kind"] in ("SELECT", "WITH") and not _SQL_VOLATILE.search(normalized_sql)
+
+    @staticmethod
+    def key(normalized_sql, account, role, warehouse, database, schema):
+        return ((account or "").lower(), (role or "").upper(), (warehouse or "").upper(),
+                (database or "").upper(), (schema or "").upper(), normalized_sql)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["expires_at"] < time.monotonic() or not entry["result"].available:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["result"]
+
+    def put(self, key, result, reads):
+        with self._lock:
+            self._entries[key] = {"result": result, "reads": set(reads), "expires_at": time.monotonic() + self.ttl}
+            self._entries.move_to_end(key)
+            self._evict_locked()
+
+    def _bytes_locked(self):
+        return sum(entry["result"].loaded_bytes for entry in self._entries.values())
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self._entries.items() if entry["expires_at"] < now]:
+            del self._entries[key]
+            self.evictions += 1
+        held = self._bytes_locked()
+        while held > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            held -= entry["result"].loaded_bytes
+            self.evictions += 1
+
+    # Drop entries of `account` that read any of `tables` (all of the account's entries when tables is None)
+    def invalidate(self, account, tables=None):
+        account = (account or "").lower()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if key[0] == account and (tables is None or entry["reads"] & set(tables))]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            self._evict_locked()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes_locked(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+@st.cache_resource
+def get_result_cache():
+    return QueryResultCache()
+
+
+# A statement's place in an admission queue
+class _AdmissionTicket:
+    def __init__(self, key, user, priority, seq, on_admit=None):
+        self.key = key
+        self.on_admit = on_admit
+        self.user = user
+        self.priority = priority
+        self.seq = seq
+        self.requested_at = time.monotonic()
+        self.admitted_at = None
+        self.released = False
+
+
+# Process-wide admission control for statements, per account/warehouse. At most `limit` statements
+# run at once on a warehouse; waiting statements are admitted by priority (lower first) and then
+# arrival, and one user can't take more than an equal share of the limit while others are waiting.
+# The limit is AIMD: it grows by about one per `limit` completions that didn't queue on the
+# warehouse and is cut by `decrease` (at most once per `cooldown` seconds) when statements sat in
+# QUEUED (warehouse overload) for more than `target_queued_s`.
+class AdmissionController:
+    def __init__(self, max_limit=32, initial_limit=8, min_limit=1, target_queued_s=1.0, decrease=0.7, cooldown=5.0):
+        self.max_limit = max_limit
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.target_queued_s = target_queued_s
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._gates = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _gate(self, key):
+        gate = self._gates.get(key)
+        if gate is None:
+            gate = self._gates[key] = {"limit": float(min(self.initial_limit, self.max_limit)), "running": {}, "waiting": [],
+                                       "admitted": 0, "increases": 0, "decreases": 0, "last_decrease": 0.0,
+                                       "queued_s": 0.0, "wait_s": 0.0}
+        return gate
+
+    # Queue a statement; on_admit is called (under the controller's lock, so keep it short) once it's let in
+    def request(self, account, warehouse, user, priority=1, on_admit=None):
+        with self._lock:
+            self._seq += 1
+            ticket = _AdmissionTicket(((account or "").lower(), (warehouse or "").upper()), (user or "").upper(), priority, self._seq, on_admit)
+            gate = self._gate(ticket.key)
+            gate["waiting"].append(ticket)
+            self._grant_locked(gate)
+            return ticket
+
+    def _grant_locked(self, gate):
+        while gate["waiting"] and sum(gate["running"].values()) < max(self.min_limit, int(min(gate["limit"], self.max_limit))):
+            users = set(gate["running"]) | {ticket.user for ticket in gate["waiting"]}
+            share = max(1, -(-int(gate["limit"]) // len(users)))
+            ordered = sorted(gate["waiting"], key=lambda ticket: (ticket.priority, ticket.seq))
+            # Work-conserving: if every waiting user is at their share, the best waiter goes anyway
+            ticket = next((t for t in ordered if gate["running"].get(t.user, 0) < share), ordered[0])
+            gate["waiting"].remove(ticket)
+            gate["running"][ticket.user] = gate["running"].get(ticket.user, 0) + 1
+            gate["admitted"] += 1
+            gate["wait_s"] += time.monotonic() - ticket.requested_at
+            ticket.admitted_at = time.monotonic()
+            if ticket.on_admit:
+                ticket.on_admit()
+
+    def admitted(self, ticket):
+        return ticket.admitted_at is not None
+
+    # Hand a ticket back (admitted or not) with how long its statement sat QUEUED on the warehouse
+    def release(self, ticket, queued_s=0.0):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            gate = self._gate(ticket.key)
+            if ticket.admitted_at is None:
+                gate["waiting"].remove(ticket)
+            else:
+                gate["running"][ticket.user] -= 1
+                if not gate["running"][ticket.user]:
+                    del gate["running"][ticket.user]
+                gate["queued_s"] += queued_s
+                now = time.monotonic()
+                if queued_s > self.target_queued_s:
+                    if now - gate["last_decrease"] >= self.cooldown:
+                        gate["limit"] = max(float(self.min_limit), gate["limit"] * self.decrease)
+                        gate["last_decrease"] = now
+                        gate["decreases"] += 1
+                elif gate["limit"] < self.max_limit:
+                    gate["limit"] = min(float(self.max_limit), gate["limit"] + 1.0 / gate["limit"])
+                    gate["increases"] += 1
+            self._grant_locked(gate)
+
+    def stats(self):
+        with self._lock:
+            return [{"account": key[0], "warehouse": key[1], "limit": gate["limit"], "running": sum(gate["running"].values()),
+                     "waiting": len(gate["waiting"]), "users": dict(gate["running"]), "admitted": gate["admitted"],
+                     "increases": gate["increases"], "decreases": gate["decreases"],
+                     "avg_wait_s": gate["wait_s"] / gate["admitted"] if gate["admitted"] else 0.0,
+                     "avg_queued_s": gate["queued_s"] / gate["admitted"] if gate["admitted"] else 0.0}
+                    for key, gate in self._gates.items()]
+
+
+# The ceiling applies to every user of the process, so it's set by whoever runs the app
+# (MYSNOWSIGHT_ADMISSION_MAX_LIMIT), not from the UI
+@st.cache_resource
+def get_admission_controller():
+    return AdmissionController(max_limit=int(os.environ.get("MYSNOWSIGHT_ADMISSION_MAX_LIMIT", 32)))
+
+
+# One statement tracked by the async query engine
+class QueryJob:
+    def __init__(self, index, sql):
+        self.index = index
+        self.sql = sql
+        self.query_id = None
+        self.status = "PENDING"
+        self.conn = None
+        self.submitted_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.access = None
+        self.cache_key = None
+        self.cancel_reason = None
+        self.ticket = None
+        self.queued_since = None
+        self.queued_s = 0.0
+
+    @property
+    def elapsed(self):
+        if self.submitted_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+
+# Submit statements with execute_async over a few pooled sessions, then poll them all from one
+# loop and yield each job as soon as its query finishes (completion order, not submission order).
+# A statement waits for the earlier ones it conflicts with (plan_statements, unless depends_on is given).
+# statement_timeout sets STATEMENT_TIMEOUT_IN_SECONDS on the sessions for the run; with fail_fast
+# the first failure cancels everything still pending or running. With an admission controller,
+# every statement waits for a warehouse slot (at `priority`) before it's submitted. With a
+# ResultSpill, results bigger than a page are streamed to disk instead of paged in memory.
+class AsyncQueryEngine:
+    def __init__(self, creds, max_sessions=4, min_poll_interval=0.1, max_poll_interval=2.0, cache=None,
+                 statement_timeout=None, fail_fast=False, admission=None, priority=1, spill=None):
+        self.creds = creds
+        self.spill = spill
+        self.admission = admission
+        self.priority = priority
+        self.cache = cache
+        self.max_sessions = max_sessions
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.statement_timeout = statement_timeout
+        self.fail_fast = fail_fast
+        self._cancel_requests = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    # Ask the running batch to cancel statement `index` (any thread); pending statements are
+    # dropped, running ones get SYSTEM$CANCEL_QUERY
+    def cancel(self, index, reason="Cancelled by user"):
+        with self._lock:
+            self._cancel_requests.setdefault(index, reason)
+        self._wake.set()
+
+    def _take_cancel_requests(self):
+        with self._lock:
+            requests, self._cancel_requests = self._cancel_requests, {}
+        return requests
+
+    # Runs on the raw session: the timeout is undone before checkin, so it doesn't count as a session change
+    def _prepare_session(self, conn, timeout):
+        cursor = getattr(conn, "raw", conn).cursor()
+        try:
+            if timeout:
+                cursor.execute(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {int(timeout)}")
+            else:
+                cursor.execute("ALTER SESSION UNSET STATEMENT_TIMEOUT_IN_SECONDS")
+        finally:
+            cursor.close()
+
+    # depends_on[i] lists the earlier statements i has to wait for; a statement whose dependency
+    # failed is skipped instead of submitted. Pass `jobs` (QueryJob per statement) to watch the
+    # pending ones from another thread.
+    def run(self, statements, depends_on=None, jobs=None):
+        jobs = jobs or [QueryJob(index, sql) for index, sql in enumerate(statements)]
+        if not jobs:
+            return
+        database, schema = self.creds[3:5]
+        plan = plan_statements([job.sql for job in jobs], database, schema)
+        depends_on = depends_on or [step["depends_on"] for step in plan]
+        # USE/SET/BEGIN/ALTER SESSION change the session they run on, so the first such statement and
+        # everything after it go to one session instead of being spread over the others
+        pinned_from = min((step["index"] for step in plan if step["barrier"]), default=len(jobs))
+        pool = get_connection_pool()
+        sessions = []
+        submitted = 0
+        try:
+            for _ in range(max(1, min(self.max_sessions, len(jobs)))):
+                sessions.append(pool.checkout(*self.creds))
+                if self.statement_timeout:
+                    self._prepare_session(sessions[-1], self.statement_timeout)
+
+            pending = list(jobs)
+            running = []
+            interval = self.min_poll_interval
+            while pending or running:
+                for index, reason in self._take_cancel_requests().items():
+                    job = jobs[index]
+                    if job in pending:
+                        pending.remove(job)
+                        job.cancel_reason = reason
+                        self._fail(job, reason)
+                        self._release(job)
+                        yield job
+                    elif job in running and job.cancel_reason is None:
+                        job.cancel_reason = reason
+                        self._cancel_query(job)
+
+                for job in list(pending):
+                    blockers = depends_on[job.index]
+                    if any(jobs[i].finished_at is None for i in blockers):
+                        continue
+                    failed = sorted(i + 1 for i in blockers if jobs[i].error)
+                    if failed:
+                        pending.remove(job)
+                        self._fail(job, f"Skipped because statement(s) {failed} failed")
+                        job.status = "SKIPPED"
+                        self._release(job)
+                        yield job
+                        continue
+                    if job.ticket is None:
+                        if self._from_cache(job):
+                            pending.remove(job)
+                            yield job
+                            continue
+                        if self.admission is not None:
+                            account, _, warehouse, _, _, user = self.creds[:6]
+                            job.ticket = self.admission.request(account, warehouse, user, self.priority, on_admit=self._wake.set)
+                            job.status = "WAITING"
+                    if job.ticket is not None and not self.admission.admitted(job.ticket):
+                        continue
+                    pending.remove(job)
+                    if job.index >= pinned_from:
+                        self._submit(job, sessions[0])
+                    else:
+                        self._submit(job, sessions[submitted % len(sessions)])
+                        submitted += 1
+                    if job.finished_at is not None:
+                        self._finished(job, jobs)
+                        yield job
+                    else:
+                        running.append(job)
+                if not running:
+                    if pending:
+                        # Everything left is waiting for admission
+                        self._wake.wait(self.min_poll_interval)
+                        self._wake.clear()
+                    continue
+
+                self._wake.wait(interval)
+                self._wake.clear()
+                still_running = []
+                for job in running:
+                    if self._poll(job):
+                        self._update_cache(job)
+                        self._finished(job, jobs)
+                        yield job
+                    else:
+                        still_running.append(job)
+                # Back off while nothing completes so long batches don't hammer the status endpoint
+                if len(still_running) == len(running):
+                    interval = min(interval * 1.5, self.max_poll_interval)
+                else:
+                    interval = self.min_poll_interval
+                running = still_running
+        finally:
+            for job in jobs:
+                job.conn = None
+                self._release(job)
+            for conn in sessions:
+                try:
+                    if self.statement_timeout:
+                        self._prepare_session(conn, None)
+                    pool.checkin(conn)
+                except Exception:
+                    pool.checkin(conn, discard=True)
+
+    def _release(self, job):
+        if job.ticket is not None:
+            if job.queued_since is not None:
+                job.queued_s += time.monotonic() - job.queued_since
+                job.queued_since = None
+            self.admission.release(job.ticket, job.queued_s)
+
+    # Give back the job's warehouse slot; with fail_fast, a real failure (not a cancel or skip)
+    # cancels everything that hasn't finished
+    def _finished(self, job, jobs):
+        self._release(job)
+        if self.fail_fast and job.error and job.status not in ("CANCELLED", "SKIPPED"):
+            for other in jobs:
+                if other.finished_at is None:
+                    self.cancel(other.index, f"Cancelled because statement {job.index + 1} failed")
+
+    def _cancel_query(self, job):
+        cursor = job.conn.cursor()
+        try:
+            cursor.execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (job.query_id,))
+        except Exception:
+            pass
+        finally:
+            cursor.close()
+
+    def _from_cache(self, job):
+        if self.cache is None:
+            return False
+        account, role, warehouse, database, schema = self.creds[:5]
+        normalized = QueryResultCache.normalize(job.sql)
+        job.access = statement_access(job.sql, database, schema)
+        if not QueryResultCache.cacheable(normalized, job.access):
+            return False
+        job.cache_key = QueryResultCache.key(normalized, account, role, warehouse, database, schema)
+        cached = self.cache.get(job.cache_key)
+        if cached is None:
+            return False
+        job.result = cached
+        job.query_id = cached.query_id
+        job.status = "CACHED"
+        job.submitted_at = job.finished_at = time.monotonic()
+        return True
+
+    # Remember read-only results and drop cached results made stale by a write
+    def _update_cache(self, job):
+        if self.cache is None or job.error:
+            return
+        if job.cache_key is not None:
+            self.cache.put(job.cache_key, job.result, job.access["reads"])
+        elif job.access["kind"] not in _SQL_READ_ONLY_VERBS | _SQL_SESSION_VERBS:
+            # Barrier statements (procedure calls included) may write anything, so forget everything for the account
+            known_writes = job.access["writes"] if not job.access["barrier"] else None
+            self.cache.invalidate(self.creds[0], known_writes)
+
+    def _submit(self, job, conn):
+        job.conn = conn
+        job.submitted_at = time.monotonic()
+        cursor = conn.cursor()
+        try:
+            cursor.execute_async(job.sql)
+            job.query_id = cursor.sfqid
+            job.status = "RUNNING"
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            cursor.close()
+
+    def _poll(self, job):
+        try:
+            status = job.conn.get_query_status_throw_if_error(job.query_id)
+        except Exception as e:
+            self._fail(job, e)
+            return True
+        job.status = status.name
+        # Time spent QUEUED is warehouse overload; it's what the admission controller backs off on
+        if job.status == "QUEUED" and job.queued_since is None:
+            job.queued_since = time.monotonic()
+        elif job.status != "QUEUED" and job.queued_since is not None:
+            job.queued_s += time.monotonic() - job.queued_since
+            job.queued_since = None
+        if job.conn.is_still_running(status):
+            return False
+        cursor = job.conn.cursor()
+        try:
+            cursor.get_results_from_sfqid(job.query_id)
+            job.result = ArrowResult.from_cursor(cursor, spill=self.spill)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            cursor.close()
+            job.finished_at = time.monotonic()
+        return True
+
+    def _fail(self, job, error):
+        if job.cancel_reason:
+            job.status, job.error = "CANCELLED", job.cancel_reason
+        elif self.statement_timeout and "timeout" in str(error).lower():
+            job.status, job.error = "TIMED OUT", str(error)
+        else:
+            job.status, job.error = "FAILED", str(error)
+        job.finished_at = time.monotonic()
+
+
+# One PARALLEL EXECUTE run driven from a background thread, so it outlives the Streamlit rerun that
+# started it: the job board reads `jobs`/`completed` and cancels through it on later reruns
+class QueryBatch:
+    def __init__(self, engine, statements, depends_on=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.engine = engine
+        self.jobs = [QueryJob(index, sql) for index, sql in enumerate(statements)]
+        self.depends_on = depends_on
+        self.completed = []
+        self.error = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self._thread = threading.Thread(target=self._run, name=f"query-batch-{self.id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for job in self.engine.run([job.sql for job in self.jobs], self.depends_on, jobs=self.jobs):
+                self.completed.append(job)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.finished_at = time.monotonic()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def cancel(self, index):
+        self.engine.cancel(index)
+
+    def cancel_all(self):
+        for job in self.jobs:
+            if job.finished_at is None:
+                self.engine.cancel(job.index)
+
+
+# Quote identifiers the way write_pandas does (case-sensitive)
+def _quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _qualified(database, schema, name):
+    return ".".join(_quote_ident(part) for part in (database, schema, name) if part)
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+# Write one DataFrame chunk as a compressed Parquet file and return its size
+def _write_parquet_chunk(df, path):
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path, compression="snappy", coerce_timestamps="us", allow_truncated_timestamps=True)
+    return os.path.getsize(path)
+
+
+# Stream DataFrame (or Arrow table) chunks into a Snowflake table without holding more than a few chunks in memory:
+# each chunk is written to a compressed Parquet file on local disk, files are PUT to a temporary
+# stage in parallel while the next chunks are converted, and one COPY INTO loads them all.
+# Chunks may also be paths of Parquet files, which are PUT (and deleted) without being read.
+def bulk_load_chunks(conn, chunks, table_name, database, schema, parallel=4, auto_create_table=True, on_progress=None):
+    stats = {"rows": 0, "files": 0, "parquet_bytes": 0, "peak_chunk_bytes": 0, "started": time.monotonic()}
+    suffix = uuid.uuid4().hex[:12].upper()
+    stage = _qualified(database, schema, f"MYSNOWSIGHT_STAGE_{suffix}")
+    file_format = _qualified(database, schema, f"MYSNOWSIGHT_PARQUET_{suffix}")
+    target = _qualified(database, schema, table_name)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"CREATE TEMPORARY FILE FORMAT {file_format} TYPE = PARQUET USE_LOGICAL_TYPE = TRUE")
+        cursor.execute(f"CREATE TEMPORARY STAGE {stage} FILE_FORMAT = {file_format}")
+
+        def put(path):
+            put_cursor = conn.cursor()
+            try:
+                put_cursor.execute(f"PUT 'file://{path.as_posix()}' @{stage} AUTO_COMPRESS = FALSE PARALLEL = 4")
+            finally:
+                put_cursor.close()
+                path.unlink()
+
+        with tempfile.TemporaryDirectory(prefix="mysnowsight_load_") as scratch, ThreadPoolExecutor(max_workers=parallel) as uploader:
+            uploads = set()
+            for chunk in chunks:
+                if isinstance(chunk, pathlib.Path):
+                    # Parquet files already on local disk (unloaded from another account) are uploaded as they are
+                    path = chunk
+                    stats["parquet_bytes"] += path.stat().st_size
+                    stats["rows"] += pq.ParquetFile(path).metadata.num_rows
+                else:
+                    if len(chunk) == 0:
+                        continue
+                    chunk_bytes = chunk.nbytes if isinstance(chunk, pa.Table) else int(chunk.memory_usage(deep=True).sum())
+                    stats["peak_chunk_bytes"] = max(stats["peak_chunk_bytes"], chunk_bytes)
+                    path = pathlib.Path(scratch) / f"part_{stats['files']:06d}.parquet"
+                    stats["parquet_bytes"] += _write_parquet_chunk(chunk, path)
+                    stats["rows"] += len(chunk)
+                stats["files"] += 1
+                del chunk
+                # Keep at most `parallel` files waiting on disk so scratch space stays bounded too
+                while len(uploads) >= parallel:
+                    done, uploads = wait(uploads, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                uploads.add(uploader.submit(put, path))
+                if on_progress:
+                    on_progress(stats)
+            for future in uploads:
+                future.result()
+
+        if stats["files"]:
+            if auto_create_table:
+                cursor.execute(f"""CREATE TABLE IF NOT EXISTS {target} USING TEMPLATE (
+                                       SELECT ARRAY_AGG(OBJECT_CONSTRUCT(*)) WITHIN GROUP (ORDER BY ORDER_ID)
+                                       FROM TABLE(INFER_SCHEMA(LOCATION => '@{stage}', FILE_FORMAT => '{file_format}')))""")
+            cursor.execute(f"COPY INTO {target} FROM @{stage} FILE_FORMAT = (FORMAT_NAME = '{file_format}') "
+                           f"MATCH_BY_COLUMN_NAME = CASE_SENSITIVE PURGE = TRUE ON_ERROR = ABORT_STATEMENT")
+    finally:
+        for drop in (f"DROP STAGE IF EXISTS {stage}", f"DROP FILE FORMAT IF EXISTS {file_format}"):
+            try:
+                cursor.execute(drop)
+            except Exception:
+                pass
+        cursor.close()
+    stats["elapsed"] = time.monotonic() - stats["started"]
+    stats["rows_per_sec"] = stats["rows"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    stats["peak_rss_bytes"] = _peak_rss_bytes()
+    return stats
+
+
+# Size chunks so one chunk of the file stays within `memory_budget` bytes once parsed
+def estimate_chunk_rows(source, file_extension, memory_budget, sample_rows=2000):
+    sample = read_file_preview(source, file_extension, nrows=sample_rows)
+    if sample.empty:
+        return sample_rows
+    bytes_per_row = max(1, int(sample.memory_usage(deep=True).sum()) // len(sample))
+    return max(1000, memory_budget // bytes_per_row)
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def read_file_preview(source, file_extension, nrows=5):
+    file_extension = file_extension.lower()
+    if file_extension in ["xls", "xlsx"]:
+        return pd.read_excel(_rewind(source), nrows=nrows)
+    return pd.read_csv(_rewind(source), encoding='utf-8', nrows=nrows)
+
+
+# Read an upload (or a path on the app host) as DataFrame chunks of `chunk_rows` rows
+def iter_file_chunks(source, file_extension, chunk_rows):
+    file_extension = file_extension.lower()
+    if file_extension == "xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(_rewind(source), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(col) for col in next(rows, [])]
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunk_rows:
+                    yield pd.DataFrame(batch, columns=header)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header)
+        finally:
+            workbook.close()
+    elif file_extension == "xls":
+        # Legacy .xls can't be streamed; read once and hand it out in slices
+        data = pd.read_excel(_rewind(source))
+        for start in range(0, len(data), chunk_rows):
+            yield data.iloc[start:start + chunk_rows]
+    else:
+        with pd.read_csv(_rewind(source), encoding='utf-8', chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+# Rows sampled to infer the column types of a file before it's loaded
+LOAD_SAMPLE_ROWS = 10000
+# In-app dtypes a column can be converted to before upload, with the Snowflake type each maps to by default
+LOAD_DTYPES = {"integer": "NUMBER(38,0)", "float32": "FLOAT", "float64": "FLOAT", "boolean": "BOOLEAN",
+               "datetime": "TIMESTAMP_NTZ", "date": "DATE", "category": "VARCHAR", "string": "VARCHAR"}
+_SNOWFLAKE_TYPE = re.compile(r"^[A-Z_]+( ?\(\s*\d+(\s*,\s*\d+)?\s*\))?$", re.IGNORECASE)
+
+
+# Parse timestamps with the format inferred from the first value (vectorized), falling back to
+# parsing every value on its own when the column mixes formats
+def _parse_datetimes(series):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            return pd.to_datetime(series)
+        except (ValueError, TypeError):
+            return pd.to_datetime(series, format="mixed")
+
+
+# Most compact dtype that holds every sampled value of `series` losslessly
+def _compact_dtype(series):
+    values = series.dropna()
+    if values.empty:
+        return "string"
+    if pd.api.types.is_bool_dtype(series) or values.map(lambda value: isinstance(value, (bool, np.bool_))).all():
+        return "boolean"
+    if pd.api.types.is_integer_dtype(series):
+        return "integer"
+    if pd.api.types.is_float_dtype(series):
+        narrow = values.astype("float32").astype("float64")
+        return "float32" if np.array_equal(narrow.to_numpy(), values.to_numpy()) else "float64"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = values
+    else:
+        # Numbers read as text (mixed columns, Excel) stay numbers
+        numeric = pd.to_numeric(values, errors="coerce")
+        if numeric.notna().all():
+            return "integer" if (numeric == numeric.round()).all() and numeric.abs().max() < 2 ** 63 else "float64"
+        # Only text with digits can be a timestamp; dateutil would happily parse "May" or "Monday"
+        parsed = None
+        if values.astype(str).str.contains(r"\d").all():
+            try:
+                parsed = _parse_datetimes(values)
+            except (ValueError, TypeError, OverflowError):
+                parsed = None
+        if parsed is None or parsed.isna().any():
+            return "category" if values.nunique() <= len(values) // 2 else "string"
+    if parsed.dt.tz is None and (parsed == parsed.dt.normalize()).all():
+        return "date"
+    return "datetime"
+
 
-                # Function to execute a single query
-                def execute_single_query(query):
-                    connection = create_snowflake_connection(account, role, warehouse, database, schema, user, password)
-                    cursor = connection.cursor()
-                    start_time = time.time()
+# Sample of a file -> one row per column: the compact dtype it's converted to in the app and the
+# Snowflake type of its column, both meant to be reviewed (and overridden) before loading
+def infer_load_schema(sample):
+    rows = []
+    for column in sample.columns:
+        series = sample[column]
+        dtype = _compact_dtype(series)
+        snowflake_type = LOAD_DTYPES[dtype]
+        if dtype == "datetime" and pd.api.types.is_datetime64_any_dtype(series) and series.dt.tz is not None:
+            snowflake_type = "TIMESTAMP_TZ"
+        values = series.dropna()
+        rows.append({"COLUMN": str(column), "SAMPLED_DTYPE": str(series.dtype), "DTYPE": dtype, "SNOWFLAKE_TYPE": snowflake_type,
+                     "NULLS": int(series.isna().sum()), "EXAMPLE": str(values.iloc[0]) if len(values) else ""})
+    return pd.DataFrame(rows, columns=["COLUMN", "SAMPLED_DTYPE", "DTYPE", "SNOWFLAKE_TYPE", "NULLS", "EXAMPLE"])
 
+
+def _convert_column(series, dtype):
+    if dtype == "integer":
+        series = pd.to_numeric(series, downcast="integer")
+        # Integers with gaps come back as float; keep them integers with pandas' nullable type
+        return series if pd.api.types.is_integer_dtype(series) else series.astype("Int64")
+    if dtype in ("float32", "float64"):
+        series = pd.to_numeric(series).astype("float64")
+        if dtype == "float32":
+            # The sample only suggested float32; a chunk that doesn't round-trip exactly stays float64
+            narrow = series.astype("float32")
+            if np.array_equal(narrow.to_numpy(dtype="float64"), series.to_numpy(), equal_nan=True):
+                return narrow
+        return series
+    if dtype == "boolean":
+        return series.astype("boolean")
+    if dtype in ("datetime", "date"):
+        parsed = _parse_datetimes(series)
+        values = parsed.dropna()
+        if dtype == "date" and not (values == values.dt.normalize()).all():
+            raise ValueError(f"{values[values != values.dt.normalize()].iloc[0]} has a time of day; load the column as datetime")
+        return parsed
+    if dtype == "category":
+        return series.astype("string[pyarrow]").astype("category")
+    return series.astype("string[pyarrow]")
+
+
+# Convert a DataFrame chunk to the reviewed dtypes and hand it on as an Arrow table ready to be written
+# as Parquet. Integers are downcast per chunk (a wider value later in the file can't overflow), float32
+# is only used where the chunk converts losslessly, and a DATE column with a time of day raises.
+def apply_load_dtypes(chunk, specs):
+    columns = {}
+    for spec in specs:
+        try:
+            columns[spec["COLUMN"]] = _convert_column(chunk[spec["COLUMN"]], spec["DTYPE"])
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Column {spec['COLUMN']} can't be converted to {spec['DTYPE']}: {e}")
+    table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+    for spec in specs:
+        if spec["DTYPE"] == "date":
+            index = table.schema.get_field_index(spec["COLUMN"])
+            table = table.set_column(index, pa.field(spec["COLUMN"], pa.date32()), pc.cast(table.column(index), pa.date32()))
+    return table
+
+
+# CREATE TABLE statement with the reviewed Snowflake type of every column
+def load_table_sql(specs, database, schema, table_name):
+    definitions = []
+    for spec in specs:
+        snowflake_type = str(spec["SNOWFLAKE_TYPE"]).strip()
+        if not _SNOWFLAKE_TYPE.match(snowflake_type):
+            raise ValueError(f"Invalid Snowflake type for column {spec['COLUMN']}: {snowflake_type}")
+        definitions.append(f"{_quote_ident(spec['COLUMN'])} {snowflake_type.upper()}")
+    return f"CREATE TABLE IF NOT EXISTS {_qualified(database, schema, table_name)} (\n    " + ",\n    ".join(definitions) + "\n)"
+
+
+# Objects per GET_DDL round trip. Every DDL comes back as its own row, so no single value has to
+# hold a whole schema and run into Snowflake's 16MB VARCHAR limit.
+DDL_BATCH_SIZE = 50
+
+
+def _get_ddl_sql(objects, offset, qualified):
+    flag = ", true" if qualified else ""
+    return " UNION ALL ".join(
+        f"SELECT {offset + i} AS ORD, GET_DDL('{object_type}', '{name.replace(chr(39), chr(39) * 2)}'{flag}) AS DDL"
+        for i, (object_type, name) in enumerate(objects))
+
+
+# Extract DDL for (object type, name) pairs: objects are batched into UNION ALL queries that run
+# concurrently on pooled sessions through the async engine. Yields one dict per object
+# {index, type, name, ddl, error} in the order batches finish; a failing batch is retried object by
+# object so one inaccessible object doesn't hide the rest.
+def extract_ddl(creds, objects, qualified=True, batch_size=DDL_BATCH_SIZE, max_sessions=4):
+    objects = list(objects)
+    statements = [_get_ddl_sql(objects[start:start + batch_size], start, qualified)
+                  for start in range(0, len(objects), batch_size)]
+    engine = AsyncQueryEngine(creds, max_sessions=max_sessions, admission=get_admission_controller())
+    for job in engine.run(statements):
+        start = job.index * batch_size
+        batch = objects[start:start + batch_size]
+        if job.error:
+            with get_connection_pool().connection(*creds) as conn:
+                for i, (object_type, name) in enumerate(batch):
                     try:
-                        cursor.execute(query)
-                        result = cursor.fetchall()
-                        columns = [col[0] for col in cursor.description] 
-                        result_df = pd.DataFrame(result, columns=columns)
-
-                        elapsed_time = time.time() - start_time
-                        st.success(f"Query: {query} Time taken: {elapsed_time:.2f} seconds")
-                        return result_df
-                    except connection.connector.errors.ProgrammingError as e:
-                        return f"Query: {query}\nError: {str(e)}\nTime taken: {elapsed_time:.2f} seconds"
-                    finally:
-                        cursor.close()
-                        connection.close()
+                        ddl = _scalar(conn, _get_ddl_sql([(object_type, name)], 0, qualified))[1]
+                        yield {"index": start + i, "type": object_type, "name": name, "ddl": ddl, "error": None}
+                    except Exception as e:
+                        yield {"index": start + i, "type": object_type, "name": name, "ddl": None, "error": str(e)}
+            continue
+        result = job.result
+        while result.has_more:
+            result.load_more()
+        rows = result.to_arrow().to_pylist()
+        for row in sorted(rows, key=lambda r: r["ORD"]):
+            object_type, name = objects[row["ORD"]]
+            yield {"index": row["ORD"], "type": object_type, "name": name, "ddl": row["DDL"], "error": None}
+
+
+# CREATE DATABASE statement for the header of whole-database DDL (which is extracted schema by schema):
+# the database-level properties GET_DDL('DATABASE') carries, rebuilt from SHOW DATABASES (TRANSIENT,
+# DATA_RETENTION_TIME_IN_DAYS, COMMENT) and the database's TAG_REFERENCES
+def database_ddl(creds, db_name):
+    with get_connection_pool().connection(*creds) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SHOW DATABASES LIKE '{db_name.replace(chr(39), chr(39) * 2)}'")
+            columns = [column[0].lower() for column in cursor.description]
+            row = next((dict(zip(columns, values)) for values in cursor.fetchall() if values[columns.index("name")] == db_name), None)
+            if row is None:
+                raise ValueError(f"Database {db_name} not found")
+            transient = "TRANSIENT" in f"{row.get('options') or ''} {row.get('kind') or ''}".upper()
+            ddl = f"create or replace {'transient ' if transient else ''}database {_quote_ident(db_name)}"
+            if row.get("retention_time") not in (None, ""):
+                ddl += f"\n\tdata_retention_time_in_days = {int(row['retention_time'])}"
+            if row.get("comment"):
+                ddl += f"\n\tcomment = '{row['comment'].replace(chr(39), chr(39) * 2)}'"
+            try:
+                cursor.execute(f"SELECT TAG_DATABASE, TAG_SCHEMA, TAG_NAME, TAG_VALUE "
+                               f"FROM TABLE({_quote_ident(db_name)}.INFORMATION_SCHEMA.TAG_REFERENCES(%s, 'database'))", (_quote_ident(db_name),))
+                tags = cursor.fetchall()
+            except Exception as e:
+                return f"{ddl};\n-- database tags not read: {e}"
+            if tags:
+                ddl += "\n\twith tag (" + ", ".join(f"{_qualified(tag_db, tag_schema, tag)} = '{str(value).replace(chr(39), chr(39) * 2)}'"
+                                                     for tag_db, tag_schema, tag, value in tags) + ")"
+            return ddl + ";"
+        finally:
+            cursor.close()
+
+
+# INFORMATION_SCHEMA view and its name/schema columns carrying LAST_ALTERED for a GENERATE DDL object type
+_LAST_ALTERED_VIEWS = {
+    "Table": ("TABLES", "TABLE_NAME", "TABLE_SCHEMA"),
+    "Dynamic Table": ("TABLES", "TABLE_NAME", "TABLE_SCHEMA"),
+    "Event Table": ("TABLES", "TABLE_NAME", "TABLE_SCHEMA"),
+    "Iceberg Table": ("TABLES", "TABLE_NAME", "TABLE_SCHEMA"),
+    "View": ("VIEWS", "TABLE_NAME", "TABLE_SCHEMA"),
+    "Function": ("FUNCTIONS", "FUNCTION_NAME", "FUNCTION_SCHEMA"),
+    "Procedure": ("PROCEDURES", "PROCEDURE_NAME", "PROCEDURE_SCHEMA"),
+    "Sequence": ("SEQUENCES", "SEQUENCE_NAME", "SEQUENCE_SCHEMA"),
+    "File Format": ("FILE_FORMATS", "FILE_FORMAT_NAME", "FILE_FORMAT_SCHEMA"),
+    "Pipe": ("PIPES", "PIPE_NAME", "PIPE_SCHEMA"),
+}
+
+
+# In-memory catalog of databases -> schemas -> object type -> objects for one account/role, so the
+# GENERATE DDL dropdowns don't cost a login plus SHOW commands on every rerun. Each node is loaded
+# the first time it's needed and, once older than `ttl`, refreshed in a background thread while the
+# stale copy keeps being served. Generated DDL is cached by (type, name, LAST_ALTERED).
+class MetadataCatalog:
+    def __init__(self, ttl=300, max_ddl_entries=5000):
+        self.ttl = ttl
+        self.max_ddl_entries = max_ddl_entries
+        self._nodes = {}
+        self._refreshing = set()
+        self._ddl = OrderedDict()
+        self._lock = threading.Lock()
+        self.ddl_hits = 0
+        self.ddl_misses = 0
+
+    def _show(self, creds, sql):
+        with get_connection_pool().connection(*creds) as conn:
+            cursor = conn.cursor()
+            try:
+                return cursor.execute(sql).fetchall()
+            finally:
+                cursor.close()
+
+    def _node(self, key, loader):
+        with self._lock:
+            node = self._nodes.get(key)
+            stale = node is not None and time.monotonic() - node["loaded_at"] > self.ttl
+            if stale and key not in self._refreshing:
+                self._refreshing.add(key)
+                threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+        if node is None:
+            node = {"items": loader(), "loaded_at": time.monotonic()}
+            with self._lock:
+                self._nodes[key] = node
+        return node["items"]
+
+    def _refresh(self, key, loader):
+        try:
+            items = loader()
+            with self._lock:
+                self._nodes[key] = {"items": items, "loaded_at": time.monotonic()}
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    # Drop everything at or below a node, e.g. ("objects", db) or () for the whole catalog
+    def invalidate(self, *prefix):
+        with self._lock:
+            for key in [key for key in self._nodes if key[:len(prefix)] == prefix]:
+                del self._nodes[key]
+
+    def age(self):
+        with self._lock:
+            return max((time.monotonic() - node["loaded_at"] for node in self._nodes.values()), default=0.0)
+
+    # The catalog is shared by sessions with different warehouses and contexts, so every lookup runs
+    # with the caller's own `creds` (account, role, warehouse, database, schema, user, password)
+    def databases(self, creds):
+        return self._node(("databases",), lambda: [row[1] for row in self._show(creds, "SHOW DATABASES")])
+
+    def schemas(self, creds, db_name):
+        return self._node(("schemas", db_name), lambda: [row[1] for row in self._show(creds, f"SHOW SCHEMAS IN DATABASE {db_name}")])
+
+    # [(display name, version)] of one object type; version is LAST_ALTERED where Snowflake has it,
+    # otherwise None so the DDL isn't cached (created_on doesn't change on ALTER)
+    def objects(self, creds, db_name, sch_name, entity_type):
+        def load():
+            if entity_type == 'Function' or entity_type == 'Procedure':
+                rows = self._show(creds, f"SHOW USER {entity_type}S IN SCHEMA {db_name}.{sch_name}")
+                objects = [(row[8], row[1]) for row in rows]
+            else:
+                rows = self._show(creds, f"SHOW {re.sub('Policy','Policie',entity_type)}S IN SCHEMA {db_name}.{sch_name}")
+                objects = [(row[1], row[1]) for row in rows]
+            altered = {}
+            if entity_type in _LAST_ALTERED_VIEWS and objects:
+                view, name_col, schema_col = _LAST_ALTERED_VIEWS[entity_type]
+                for name, last_altered in self._show(creds, f"SELECT {name_col}, MAX(LAST_ALTERED) FROM {db_name}.INFORMATION_SCHEMA.{view} "
+                                                     f"WHERE {schema_col} = '{sch_name.replace(chr(39), chr(39) * 2)}' GROUP BY 1"):
+                    altered[name] = str(last_altered)
+            return [(display, altered.get(name)) for display, name in objects]
+        return self._node(("objects", db_name, sch_name, entity_type), load)
+
+    # Like extract_ddl, but objects are (type, name, version) and DDL of unchanged objects comes
+    # from the cache; version None means "don't cache"
+    def ddl(self, creds, objects):
+        misses = []
+        for index, (object_type, name, version) in enumerate(objects):
+            with self._lock:
+                cached = self._ddl.get((object_type, name, version)) if version is not None else None
+                if cached is not None:
+                    self._ddl.move_to_end((object_type, name, version))
+                    self.ddl_hits += 1
+                else:
+                    self.ddl_misses += 1
+            if cached is not None:
+                yield {"index": index, "type": object_type, "name": name, "ddl": cached, "error": None}
+            else:
+                misses.append(index)
+        for row in extract_ddl(creds, [objects[i][:2] for i in misses]):
+            object_type, name, version = objects[misses[row["index"]]]
+            if row["error"] is None and version is not None:
+                with self._lock:
+                    self._ddl[(object_type, name, version)] = row["ddl"]
+                    while len(self._ddl) > self.max_ddl_entries:
+                        self._ddl.popitem(last=False)
+            yield dict(row, index=misses[row["index"]])
+
+
+@st.cache_resource
+def _metadata_catalog(account, role, user, password_digest):
+    return MetadataCatalog()
+
+
+# Catalog shared by every session of the same account/role/user (and password)
+def get_metadata_catalog(account, role, user, password):
+    key = SnowflakeConnectionPool.pool_key(account, role, None, user, password)
+    return _metadata_catalog(key[0], key[1], key[3], key[4])
+
+
+# Base tables of a schema in creation order (the order their DDL has to be replayed in)
+def list_tables_by_creation(conn, database, schema):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""SELECT TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME
+                           FROM {_quote_ident(database)}.INFORMATION_SCHEMA.TABLES
+                           WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_NAME NOT LIKE '%%TEMP_VIEW_DEFS%%'
+                             AND TABLE_SCHEMA = %s AND IS_TEMPORARY = 'NO'
+                           ORDER BY CREATED ASC""", (schema,))
+        return [f'{catalog}.{table_schema}."{name}"' for catalog, table_schema, name in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+# A schema's permanent base tables, largest first so the long copies start early and the
+# overall makespan of a parallel replication shrinks
+def list_tables_by_size(conn, database, schema):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""SELECT TABLE_NAME, ROW_COUNT, BYTES
+                           FROM {_quote_ident(database)}.INFORMATION_SCHEMA.TABLES
+                           WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'
+                             AND IS_TEMPORARY = 'NO' AND IS_TRANSIENT = 'NO'
+                           ORDER BY BYTES DESC NULLS LAST, TABLE_NAME""", (schema,))
+        return [{"name": name, "rows": rows or 0, "bytes": size or 0} for name, rows, size in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+# Local folder for state that must survive app restarts (checkpoints, spools, exports)
+APP_DIR = pathlib.Path(".mysnowsight")
+
+# Host directory LOAD FILE may read files from, set by whoever runs the app (MYSNOWSIGHT_LOAD_ROOT);
+# without it only uploaded files can be loaded
+LOAD_FILE_ROOT = os.environ.get("MYSNOWSIGHT_LOAD_ROOT")
+
+
+# Resolve a host path typed into LOAD FILE (relative to LOAD_FILE_ROOT), refusing anything that ends up
+# outside it through "..", an absolute path or a symlink
+def resolve_load_path(path):
+    if not LOAD_FILE_ROOT:
+        raise ValueError("Loading files from the app host is disabled")
+    root = pathlib.Path(LOAD_FILE_ROOT).resolve()
+    resolved = (root / path).resolve()
+    if not resolved.is_relative_to(root):
+        raise ValueError(f"{path} is outside {root}")
+    if not resolved.is_file():
+        raise ValueError(f"File not found: {path}")
+    return resolved
+
+
+def _write_json_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2, default=str))
+    os.replace(tmp, path)
+
+
+# Per source/destination pair checkpoint of an incremental replication. It records what each table
+# looked like at its last successful sync and which tables/chunks the current run has finished, so
+# an interrupted run picks up where it stopped.
+class ReplicationCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = json.loads(path.read_text()) if path.exists() else {"finished": True, "completed": [], "tables": {}}
+        self.resuming = False
+
+    @classmethod
+    def for_pair(cls, source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema):
+        pair = "|".join(str(part).upper() for part in (source_creds[0], source_database, source_schema,
+                                                        dest_creds[0], dest_database, dest_schema))
+        return cls(APP_DIR / "checkpoints" / f"replication_{hashlib.sha256(pair.encode()).hexdigest()[:16]}.json")
+
+    # Resume the previous run if it never finished, otherwise start a new one
+    def start(self):
+        with self._lock:
+            self.resuming = not self.data.get("finished", True)
+            if not self.resuming:
+                self.data.update(run_started=datetime.now().isoformat(), finished=False, completed=[], chunks={})
+            self._save()
+
+    def finish(self):
+        with self._lock:
+            self.data["finished"] = True
+            self._save()
+
+    def discard(self):
+        with self._lock:
+            self.data = {"finished": True, "completed": [], "tables": {}}
+            if self.path.exists():
+                self.path.unlink()
+
+    def completed(self, table):
+        return self.resuming and table in self.data["completed"]
+
+    def last_sync(self, table):
+        return self.data["tables"].get(table)
+
+    def record_chunk(self, table, watermark):
+        with self._lock:
+            self.data.setdefault("chunks", {}).setdefault(table, []).append(str(watermark))
+            self._save()
+
+    def record_table(self, table, **sync):
+        with self._lock:
+            self.data["tables"][table] = dict(sync, synced_at=datetime.now().isoformat())
+            if table not in self.data["completed"]:
+                self.data["completed"].append(table)
+            self._save()
+
+    def _save(self):
+        _write_json_atomic(self.path, self.data)
+
+
+def _table_metadata(conn, database, schema, table):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""SELECT ROW_COUNT, LAST_ALTERED FROM {_quote_ident(database)}.INFORMATION_SCHEMA.TABLES
+                           WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s""", (schema, table))
+        row = cursor.fetchone()
+        return {"rows": row[0], "last_altered": str(row[1])} if row else None
+    finally:
+        cursor.close()
+
+
+def _scalar(conn, sql, params=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+# Row count + order-independent content hash of a table
+def table_fingerprint(conn, database, schema, table):
+    rows, content_hash = _scalar(conn, f"SELECT COUNT(*), HASH_AGG(*) FROM {_qualified(database, schema, table)}")
+    return {"rows": rows, "hash": content_hash}
+
+
+# Incremental counterpart of copy_table_streaming:
+#   * tables finished by an interrupted run are skipped outright when resuming
+#   * tables whose source LAST_ALTERED and destination row count match the last sync are skipped,
+#     otherwise COUNT(*) + HASH_AGG(*) on both sides decides whether anything changed
+#   * tables with a watermark column copy only rows above the destination's MAX(column), in
+#     NTILE ranges of about `chunk_rows` rows that are committed and checkpointed one by one
+#   * anything else that changed is truncated and copied in full
+def copy_table_incremental(checkpoint, watermark_columns, chunk_rows,
+                           source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, progress):
+    table = progress["table"]
+    if checkpoint.completed(table):
+        progress["status"] = "skipped (checkpoint)"
+        return
+    pool = get_connection_pool()
+    with pool.connections(source_creds, dest_creds) as (source_conn, dest_conn):
+        source_table = _qualified(source_database, source_schema, table)
+        dest_table = _qualified(dest_database, dest_schema, table)
+        source_meta = _table_metadata(source_conn, source_database, source_schema, table)
+        dest_meta = _table_metadata(dest_conn, dest_database, dest_schema, table)
+        watermark = watermark_columns.get(table.upper())
+
+        if watermark and dest_meta:
+            column = _quote_ident(watermark)
+            high = _scalar(dest_conn, f"SELECT MAX({column}) FROM {dest_table}")[0]
+            where, params = (f" WHERE {column} > %s", (high,)) if high is not None else ("", None)
+            delta = _scalar(source_conn, f"SELECT COUNT(*) FROM {source_table}{where}", params)[0]
+            progress["total_rows"] = delta
+            if delta == 0:
+                progress["status"] = "skipped (no new rows)"
+            else:
+                # Upper bounds of ranges holding ~chunk_rows rows each; ties never straddle a range
+                buckets = max(1, -(-delta // chunk_rows))
+                cursor = source_conn.cursor()
+                try:
+                    cursor.execute(f"""SELECT MAX(w) FROM (SELECT {column} AS w, NTILE({buckets}) OVER (ORDER BY {column}) AS bucket
+                                                          FROM {source_table}{where}) GROUP BY bucket ORDER BY 1""", params)
+                    bounds = [row[0] for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+                for bound in bounds:
+                    chunk_where = f"{where} AND {column} <= %s" if high is not None else f" WHERE {column} <= %s"
+                    chunk_params = (high, bound) if high is not None else (bound,)
+                    progress["status"] = "copying"
+                    _stream_query_into(source_conn, dest_conn, f"SELECT * FROM {source_table}{chunk_where}", chunk_params,
+                                       table, dest_database, dest_schema, progress)
+                    checkpoint.record_chunk(table, bound)
+                    high, where = bound, f" WHERE {column} > %s"
+                progress["status"] = "done (delta)"
+            checkpoint.record_table(table, mode="watermark", watermark=high, source_last_altered=source_meta and source_meta["last_altered"])
+            return
+
+        if dest_meta:
+            previous = checkpoint.last_sync(table)
+            if (previous and source_meta and previous.get("source_last_altered") == source_meta["last_altered"]
+                    and previous.get("rows") == dest_meta["rows"]):
+                progress["status"] = "skipped (unchanged)"
+                checkpoint.record_table(table, **previous)
+                return
+            source_print = table_fingerprint(source_conn, source_database, source_schema, table)
+            dest_print = table_fingerprint(dest_conn, dest_database, dest_schema, table)
+            if source_print == dest_print:
+                progress["status"] = "skipped (identical)"
+                checkpoint.record_table(table, mode="full", rows=source_print["rows"], hash=source_print["hash"],
+                                        source_last_altered=source_meta and source_meta["last_altered"])
+                return
+            _scalar(dest_conn, f"TRUNCATE TABLE {dest_table}")
+
+        _stream_query_into(source_conn, dest_conn, f"SELECT * FROM {source_table}", None, table, dest_database, dest_schema, progress)
+        checkpoint.record_table(table, mode="full", rows=progress["rows"],
+                                source_last_altered=source_meta and source_meta["last_altered"])
+
+
+# Stream the rows of `select_sql` from the source session into a destination table in Arrow batches
+def _stream_query_into(source_conn, dest_conn, select_sql, params, table, dest_database, dest_schema, progress):
+    cursor = source_conn.cursor()
+    try:
+        cursor.execute(select_sql, params)
+
+        def batches():
+            for batch in cursor.fetch_arrow_batches():
+                progress["rows"] += batch.num_rows
+                progress["bytes"] += batch.nbytes
+                yield batch
+            progress["status"] = "loading"
+
+        return bulk_load_chunks(dest_conn, batches(), table, dest_database, dest_schema)
+    finally:
+        cursor.close()
+
+
+# Copy one table by streaming Arrow batches from the source cursor into the staged bulk loader,
+# so at most a few batches of the table are ever in memory
+def copy_table_streaming(source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, progress):
+    pool = get_connection_pool()
+    with pool.connections(source_creds, dest_creds) as (source_conn, dest_conn):
+        return _stream_query_into(source_conn, dest_conn, f"SELECT * FROM {_qualified(source_database, source_schema, progress['table'])}",
+                                  None, progress["table"], dest_database, dest_schema, progress)
+
+
+# Same-account fast path: a zero-copy CLONE of the source table, which only writes metadata
+def copy_table_clone(source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, progress):
+    if not same_account(source_creds, dest_creds):
+        raise ValueError("CLONE needs the source and destination in the same account")
+    source_table = _qualified(source_database, source_schema, progress["table"])
+    dest_table = _qualified(dest_database, dest_schema, progress["table"])
+    if source_table == dest_table:
+        raise ValueError(f"Source and destination are the same table: {source_table}")
+    with get_connection_pool().connection(*dest_creds) as dest_conn:
+        _scalar(dest_conn, f"CREATE OR REPLACE TABLE {dest_table} CLONE {source_table}")
+    progress["rows"], progress["bytes"] = progress["total_rows"], progress["total_bytes"]
+
+
+def same_account(source_creds, dest_creds):
+    return (source_creds[0] or "").lower() == (dest_creds[0] or "").lower()
+
+
+# Parquet files per unload; smaller files mean more GET/PUT parallelism, bigger ones fewer round trips
+UNLOAD_FILE_BYTES = 64 * 1024 * 1024
+
+
+# GET unloaded files from `stage` into `scratch` with up to `parallel` downloads in flight, yielding
+# each file's path (in stage order) as soon as it's on disk
+def _get_stage_files(conn, stage, names, scratch, parallel, progress):
+    def get(name):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"GET @{stage}/{name} 'file://{pathlib.Path(scratch).as_posix()}/'")
+        finally:
+            cursor.close()
+        return pathlib.Path(scratch) / name.rsplit("/", 1)[-1]
+
+    def downloaded(future):
+        path = future.result()
+        progress["rows"] += pq.ParquetFile(path).metadata.num_rows
+        progress["bytes"] += path.stat().st_size
+        return path
+
+    with ThreadPoolExecutor(max_workers=parallel) as downloader:
+        downloads = deque()
+        for name in names:
+            downloads.append(downloader.submit(get, name))
+            if len(downloads) >= parallel:
+                yield downloaded(downloads.popleft())
+        while downloads:
+            yield downloaded(downloads.popleft())
+    progress["status"] = "loading"
+
+
+# Server-side bulk path: the source warehouse unloads the table to snappy Parquet on a temporary
+# stage (COPY INTO @stage), the files are downloaded with GET and uploaded to the destination with PUT
+# in parallel (each file is deleted as soon as it's uploaded), and the destination runs one COPY INTO.
+# No row passes through pandas; bytes/sec counts the compressed Parquet moved.
+def copy_table_unload(source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, progress, parallel=4):
+    table = progress["table"]
+    stage = _qualified(source_database, source_schema, f"MYSNOWSIGHT_UNLOAD_{uuid.uuid4().hex[:12].upper()}")
+    pool = get_connection_pool()
+    with pool.connections(source_creds, dest_creds) as (source_conn, dest_conn):
+        cursor = source_conn.cursor()
+        try:
+            cursor.execute(f"CREATE TEMPORARY STAGE {stage}")
+            progress["status"] = "unloading"
+            cursor.execute(f"COPY INTO @{stage}/data/ FROM {_qualified(source_database, source_schema, table)} "
+                           f"FILE_FORMAT = (TYPE = PARQUET COMPRESSION = SNAPPY) HEADER = TRUE MAX_FILE_SIZE = {UNLOAD_FILE_BYTES}")
+            cursor.execute(f"LIST @{stage}")
+            # LIST names start with the stage's own name
+            names = [row[0].split("/", 1)[1] for row in cursor.fetchall()]
+            progress["status"] = "transferring"
+            with tempfile.TemporaryDirectory(prefix="mysnowsight_unload_") as scratch:
+                return bulk_load_chunks(dest_conn, _get_stage_files(source_conn, stage, names, scratch, parallel, progress),
+                                        table, dest_database, dest_schema, parallel=parallel)
+        finally:
+            try:
+                cursor.execute(f"DROP STAGE IF EXISTS {stage}")
+            except Exception:
+                pass
+            cursor.close()
+
+
+REPLICATION_COPIES = {"clone": copy_table_clone, "unload": copy_table_unload, "stream": copy_table_streaming}
+# Tables at least this big are unloaded through a stage until throughput for their size has been measured
+UNLOAD_MIN_BYTES = 64 * 1024 * 1024
+
+
+# Rows/sec each copy mode achieved per table size class (powers of eight bytes) for one source/destination
+# account pair, kept across runs. Automatic replication tries every candidate mode once per size class
+# and then sticks to the fastest one measured.
+class ReplicationThroughput:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = json.loads(path.read_text()) if path.exists() else {}
+
+    @classmethod
+    def for_pair(cls, source_creds, dest_creds):
+        pair = "|".join(str(part).lower() for part in (source_creds[0], dest_creds[0]))
+        return cls(APP_DIR / "throughput" / f"replication_{hashlib.sha256(pair.encode()).hexdigest()[:16]}.json")
+
+    @staticmethod
+    def size_class(table_bytes):
+        return str((max(int(table_bytes or 0), 1).bit_length() - 1) // 3)
+
+    def rows_per_sec(self, mode, size_class):
+        measured = self.data.get(size_class, {}).get(mode)
+        return measured["rows"] / measured["seconds"] if measured and measured["seconds"] else None
+
+    def choose(self, table_bytes, modes):
+        size_class = self.size_class(table_bytes)
+        default = "unload" if "unload" in modes and (table_bytes or 0) >= UNLOAD_MIN_BYTES else modes[-1]
+        with self._lock:
+            measured = {mode: self.rows_per_sec(mode, size_class) for mode in modes}
+        unmeasured = sorted((mode for mode, speed in measured.items() if speed is None), key=lambda mode: mode != default)
+        if unmeasured:
+            return unmeasured[0]
+        return max(measured, key=measured.get)
+
+    def record(self, mode, table_bytes, rows, seconds):
+        with self._lock:
+            measured = self.data.setdefault(self.size_class(table_bytes), {}).setdefault(mode, {"tables": 0, "rows": 0, "seconds": 0.0})
+            measured["tables"] += 1
+            measured["rows"] += rows
+            measured["seconds"] += seconds
+            _write_json_atomic(self.path, self.data)
+
+    def summary(self):
+        with self._lock:
+            return [{"Table size": f"≥ {_format_bytes(8 ** int(size_class))}", "Mode": mode, "Tables": measured["tables"],
+                     "Rows/sec": f"{measured['rows'] / measured['seconds'] if measured['seconds'] else 0:,.0f}"}
+                    for size_class, modes in sorted(self.data.items(), key=lambda item: int(item[0]))
+                    for mode, measured in sorted(modes.items())]
+
+
+# Copy one table with the mode `throughput` picks among `modes` for its size, then record how fast it went
+def copy_table_auto(throughput, modes, source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, progress):
+    mode = throughput.choose(progress["total_bytes"], modes)
+    progress["mode"] = mode
+    started = time.monotonic()
+    REPLICATION_COPIES[mode](source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, progress)
+    throughput.record(mode, progress["total_bytes"], progress["rows"], time.monotonic() - started)
+
+
+# Returns False when the copy never started because the pool had no sessions to lend, so it can be queued again
+def _run_table_copy(copy_table, progress, *args):
+    progress["status"] = "copying"
+    progress["started"] = time.monotonic()
+    try:
+        copy_table(*args, progress)
+        if progress["status"] in ("copying", "unloading", "transferring", "loading"):
+            progress["status"] = "done"
+    except PoolTimeoutError:
+        progress["status"] = "queued (waiting for sessions)"
+        progress["started"] = None
+        return False
+    except Exception as e:
+        progress["status"] = "failed"
+        progress["error"] = str(e)
+    finally:
+        progress["finished"] = time.monotonic() if progress["started"] else None
+    return True
+
+
+# Copy `tables` (as returned by list_tables_by_size) with up to `workers` tables in flight; each needs a
+# source and a destination session, and a table that can't get them in time goes back in the queue.
+# on_progress is called from the calling thread about twice a second with the per-table progress.
+def replicate_tables(source_creds, dest_creds, tables, source_database, source_schema, dest_database, dest_schema,
+                     workers=4, on_progress=None, copy_table=copy_table_streaming):
+    progress = [{"table": table["name"], "status": "queued", "mode": None, "rows": 0, "total_rows": table["rows"],
+                 "total_bytes": table["bytes"], "bytes": 0, "started": None, "finished": None, "error": None}
+                for table in tables]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def submit(item):
+            future = executor.submit(_run_table_copy, copy_table, item, source_creds, dest_creds,
+                                     source_database, source_schema, dest_database, dest_schema)
+            items[future] = item
+            return future
+
+        items = {}
+        pending = {submit(item) for item in progress}
+        while pending:
+            done, pending = wait(pending, timeout=0.5)
+            for future in done:
+                if not future.result():
+                    pending.add(submit(items.pop(future)))
+            if on_progress:
+                on_progress(progress)
+    return progress
+
+
+# Rows/sec, MB/sec and ETA for one table's progress entry
+def table_throughput(item):
+    if not item["started"]:
+        return 0.0, 0.0, None
+    elapsed = max((item["finished"] or time.monotonic()) - item["started"], 1e-6)
+    rows_per_sec = item["rows"] / elapsed
+    mb_per_sec = item["bytes"] / 1024 / 1024 / elapsed
+    remaining = max(item["total_rows"] - item["rows"], 0)
+    eta = remaining / rows_per_sec if rows_per_sec and item["status"] in ("copying", "transferring") else None
+    return rows_per_sec, mb_per_sec, eta
+
+
+
+# Token bucket shared by the model-call workers: `rate` calls per second on average, bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+# Invoice question answering with Gemini; anything with the same answer() signature can stand in for it
+class GeminiInvoiceModel:
+    name = "gemini-1.5-flash"
+
+    def __init__(self, api_key):
+        genai = _import("google.generativeai")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(self.name)
+
+    def answer(self, prompt, image_part, question):
+        return self.model.generate_content([prompt, image_part, question]).text
+
+
+# Shrink an invoice image to at most max_side pixels on its longest side and recompress it as JPEG.
+# Returns the model's image part; the original is kept when recompressing doesn't make it smaller.
+def prepare_invoice_image(data, mime_type, max_side=1600, quality=85):
+    try:
+        image = _import("PIL.Image").open(io.BytesIO(data))
+        image.thumbnail((max_side, max_side))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality, optimize=True)
+    except Exception:
+        return {"mime_type": mime_type, "data": data}
+    if out.tell() >= len(data):
+        return {"mime_type": mime_type, "data": data}
+    return {"mime_type": "image/jpeg", "data": out.getvalue()}
+
+
+# LRU of model answers keyed by (image SHA-256, prompt, question, model), shared by every session
+class InvoiceAnswerCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image_sha256, prompt, question, model_name):
+        return (image_sha256, " ".join(prompt.split()), question.strip(), model_name)
+
+    def get(self, key):
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, key, answer):
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+@st.cache_resource
+def get_invoice_answer_cache():
+    return InvoiceAnswerCache()
+
+
+def _answer_invoice(model, bucket, cache, prompt, question, item, max_side, retries):
+    started = time.monotonic()
+    data = item["data"]
+    result = {"name": item["name"], "sha256": hashlib.sha256(data).hexdigest(), "answer": None, "error": None,
+              "cached": False, "attempts": 0, "original_bytes": len(data), "sent_bytes": 0}
+    key = InvoiceAnswerCache.key(result["sha256"], prompt, question, model.name)
+    result["answer"] = cache.get(key) if cache else None
+    if result["answer"] is not None:
+        result["cached"] = True
+    else:
+        image_part = prepare_invoice_image(data, item["mime_type"], max_side)
+        result["sent_bytes"] = len(image_part["data"])
+        while result["answer"] is None:
+            result["attempts"] += 1
+            bucket.acquire()
+            try:
+                result["answer"] = model.answer(prompt, image_part, question)
+            except Exception as e:
+                if result["attempts"] > retries:
+                    result["error"] = str(e)
+                    break
+                time.sleep(min(30.0, 2 ** (result["attempts"] - 1)) * random.uniform(0.5, 1.5))
+        if result["answer"] is not None and cache:
+            cache.put(key, result["answer"])
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+
+# Ask `question` about every invoice in `items` ({name, mime_type, data}) with up to `workers` calls in
+# flight and at most `rate_per_minute` model calls a minute. Cached answers come back without a call;
+# failed calls are retried with exponential backoff. Yields one result per invoice as it completes.
+def answer_invoices(model, items, prompt, question, cache=None, workers=8, rate_per_minute=60, max_side=1600, retries=3):
+    bucket = TokenBucket(rate_per_minute / 60.0, capacity=max(1, workers))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {executor.submit(_answer_invoice, model, bucket, cache, prompt, question, item, max_side, retries)
+                   for item in items}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+# Write-behind queue for one Snowflake table. Rows are appended to a local spool file (fsync'd) and
+# to an in-memory buffer; a background thread writes the buffer with one write_pandas on a pooled
+# session once it holds max_rows rows or its oldest row is max_delay seconds old. Spooled rows that
+# were never written (app restart, failed flush) are picked up again on the next start, so delivery
+# is at-least-once.
+class WriteBehindSink:
+    def __init__(self, spool_dir, database, schema, table, max_rows=500, max_delay=30.0, datetime_columns=()):
+        self.creds = None
+        self.spool_dir = spool_dir
+        self.database = database
+        self.schema = schema
+        self.table = table
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.datetime_columns = datetime_columns
+        self._rows = []
+        self._oldest = None
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.written_rows = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_batch_rows = 0
+        self.max_batch_rows = 0
+        self.last_flush_s = 0.0
+        self.total_flush_s = 0.0
+        self.last_wait_s = 0.0
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._recover()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @property
+    def _pending_path(self):
+        return self.spool_dir / "pending.jsonl"
+
+    def _recover(self):
+        for path in sorted(self.spool_dir.glob("*.jsonl"), key=lambda p: p.stat().st_mtime):
+            with open(path, encoding="utf-8") as spool:
+                self._rows.extend(json.loads(line) for line in spool if line.strip())
+        if self._rows:
+            self._oldest = time.monotonic()
+        self._rewrite_spool(self._rows)
+        for path in self.spool_dir.glob("flushing-*.jsonl"):
+            path.unlink()
+
+    def _rewrite_spool(self, rows):
+        tmp = self.spool_dir / "pending.jsonl.tmp"
+        with open(tmp, "w", encoding="utf-8") as spool:
+            for row in rows:
+                spool.write(json.dumps(row, default=str) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+        os.replace(tmp, self._pending_path)
+
+    def append(self, rows):
+        with self._cond:
+            with open(self._pending_path, "a", encoding="utf-8") as spool:
+                for row in rows:
+                    spool.write(json.dumps(row, default=str) + "\n")
+                spool.flush()
+                os.fsync(spool.fileno())
+            self._rows.extend(json.loads(json.dumps(row, default=str)) for row in rows)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._cond.notify()
+
+    # Write whatever is buffered now; returns the number of rows written
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                if not self._rows or self.creds is None:
+                    return 0
+                batch, oldest = self._rows, self._oldest
+                self._rows, self._oldest = [], None
+                in_flight = self.spool_dir / f"flushing-{uuid.uuid4().hex}.jsonl"
+                os.replace(self._pending_path, in_flight)
+                self._rewrite_spool([])
+            started = time.monotonic()
+            try:
+                df = pd.DataFrame(batch)
+                for column in self.datetime_columns:
+                    if column in df:
+                        df[column] = pd.to_datetime(df[column])
+                with get_connection_pool().connection(*self.creds) as conn:
+                    write_pandas(conn=conn, df=df, table_name=self.table, database=self.database, schema=self.schema,
+                                 auto_create_table=True)
+            except Exception as e:
+                with self._cond:
+                    self._rows = batch + self._rows
+                    self._oldest = oldest
+                    self._rewrite_spool(self._rows)
+                    in_flight.unlink()
+                    self.failures += 1
+                    self.last_error = str(e)
+                    self._retry_at = time.monotonic() + min(300.0, 5.0 * 2 ** min(self.failures, 6))
+                raise
+            finished = time.monotonic()
+            in_flight.unlink()
+            with self._cond:
+                self.flushes += 1
+                self.written_rows += len(batch)
+                self.last_batch_rows = len(batch)
+                self.max_batch_rows = max(self.max_batch_rows, len(batch))
+                self.last_flush_s = finished - started
+                self.total_flush_s += finished - started
+                self.last_wait_s = finished - oldest
+                self.last_error = None
+            return len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._rows and self.creds is not None and now >= self._retry_at:
+                        due = self._oldest + self.max_delay
+                        if len(self._rows) >= self.max_rows or now >= due:
+                            break
+                        self._cond.wait(max(due, self._retry_at) - now)
+                    else:
+                        self._cond.wait(max(self._retry_at - now, 1.0))
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {"pending": len(self._rows), "oldest_s": time.monotonic() - self._oldest if self._oldest else 0.0,
+                    "written": self.written_rows, "flushes": self.flushes, "failures": self.failures,
+                    "last_error": self.last_error, "last_batch_rows": self.last_batch_rows,
+                    "max_batch_rows": self.max_batch_rows, "last_flush_s": self.last_flush_s,
+                    "avg_flush_s": self.total_flush_s / self.flushes if self.flushes else 0.0,
+                    "last_wait_s": self.last_wait_s}
+
+
+@st.cache_resource
+def _write_behind_sink(account, role, warehouse, user, password_digest, database, schema, table):
+    name = hashlib.sha256("|".join([account, role, warehouse, user, password_digest, database, schema, table]).upper().encode()).hexdigest()[:16]
+    return WriteBehindSink(APP_DIR / "spool" / name, database, schema, table, datetime_columns=("TIMESTAMP",))
+
+
+# Sink for `table` shared by every session writing to the same table with the same account, role,
+# warehouse, user and password, so queued rows are always flushed under the identity that queued them
+def get_write_behind_sink(table, account, role, warehouse, database, schema, user, password):
+    key = SnowflakeConnectionPool.pool_key(account, role, warehouse, user, password)
+    sink = _write_behind_sink(*key, database, schema, table)
+    if sink.creds is None:
+        sink.creds = (account, role, warehouse, database, schema, user, password)
+    return sink
+
+
+# Rows per generated chunk (one Parquet file each) for the test data generator
+TESTDATA_CHUNK_ROWS = 500000
+# Distinct parent keys fetched for a "foreign key" column
+TESTDATA_FK_KEYS = 1000000
+TESTDATA_DISTRIBUTIONS = ["sequence", "uniform", "normal", "date", "categorical", "foreign key", "text", "null"]
+
+
+# Columns of a table in ordinal order, from INFORMATION_SCHEMA
+def table_columns(conn, database, schema, table):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""SELECT COLUMN_NAME, DATA_TYPE, NUMERIC_SCALE, CHARACTER_MAXIMUM_LENGTH
+                           FROM {_quote_ident(database)}.INFORMATION_SCHEMA.COLUMNS
+                           WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION""", (schema, table))
+        return [{"name": name, "data_type": data_type, "scale": scale, "length": length}
+                for name, data_type, scale, length in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _column_family(spec):
+    data_type = spec["DATA_TYPE"]
+    if data_type == "NUMBER":
+        return "int" if not spec["SCALE"] else "float"
+    if data_type in ("FLOAT", "TEXT", "BOOLEAN", "DATE"):
+        return {"FLOAT": "float", "TEXT": "text", "BOOLEAN": "bool", "DATE": "date"}[data_type]
+    if data_type.startswith("TIMESTAMP"):
+        return "timestamp"
+    return "other"
+
+
+# Editable per-column generator settings with a sensible default distribution for each column type
+def default_column_specs(columns):
+    today = datetime.now().strftime("%Y-%m-%d")
+    specs = []
+    for position, column in enumerate(columns):
+        spec = {"COLUMN": column["name"], "DATA_TYPE": column["data_type"], "SCALE": column["scale"] or 0,
+                "LENGTH": column["length"] or 0, "DISTRIBUTION": "null", "MIN": "", "MAX": "", "MEAN": "",
+                "STDDEV": "", "VALUES": "", "WEIGHTS": "", "PARENT": "", "NULL_FRACTION": 0.0}
+        family = _column_family(spec)
+        if family == "int" and position == 0:
+            spec.update(DISTRIBUTION="sequence", MIN="1")
+        elif family == "int":
+            spec.update(DISTRIBUTION="uniform", MIN="0", MAX="1000000")
+        elif family == "float":
+            spec.update(DISTRIBUTION="normal", MEAN="100", STDDEV="25")
+        elif family == "text":
+            spec.update(DISTRIBUTION="text", MIN="0", MAX="1000000")
+        elif family == "bool":
+            spec.update(DISTRIBUTION="categorical", VALUES="TRUE,FALSE", WEIGHTS="1,1")
+        elif family in ("date", "timestamp"):
+            spec.update(DISTRIBUTION="date", MIN="2020-01-01", MAX=today)
+        specs.append(spec)
+    return pd.DataFrame(specs)
+
+
+def _categorical(spec):
+    values = [value.strip() for value in str(spec["VALUES"]).split(",")]
+    weights = [float(weight) for weight in str(spec["WEIGHTS"]).split(",")] if str(spec["WEIGHTS"]).strip() else [1.0] * len(values)
+    if len(weights) != len(values) or min(weights) < 0 or sum(weights) <= 0:
+        raise ValueError(f"{spec['COLUMN']}: VALUES and WEIGHTS must have the same number of entries and positive weights")
+    return values, np.array(weights)
+
+
+def _parse_value(value, family):
+    if family == "int":
+        return int(float(value))
+    if family == "float":
+        return float(value)
+    if family == "bool":
+        return value.upper() in ("TRUE", "T", "YES", "Y", "1")
+    if family == "date":
+        return np.datetime64(value, "D")
+    if family == "timestamp":
+        return np.datetime64(value, "s")
+    return value
+
+
+# PARENT is TABLE.COLUMN, SCHEMA.TABLE.COLUMN or DB.SCHEMA.TABLE.COLUMN, relative to the target table
+def _parent_key(spec, database, schema):
+    parts = [part.strip().strip('"').upper() for part in str(spec["PARENT"]).split(".")]
+    if len(parts) < 2 or len(parts) > 4:
+        raise ValueError(f"{spec['COLUMN']}: PARENT must look like TABLE.COLUMN")
+    names = [database, schema][:4 - len(parts)] + parts[:-1]
+    return _qualified(*names), _quote_ident(parts[-1])
+
+
+# Distinct keys of every "foreign key" column's parent, as Arrow arrays by column name
+def load_foreign_keys(conn, specs, database, schema, limit=TESTDATA_FK_KEYS):
+    keys = {}
+    cursor = conn.cursor()
+    try:
+        for spec in specs:
+            if spec["DISTRIBUTION"] != "foreign key":
+                continue
+            parent, column = _parent_key(spec, database, schema)
+            cursor.execute(f"SELECT DISTINCT {column} FROM {parent} WHERE {column} IS NOT NULL LIMIT {int(limit)}")
+            table = cursor.fetch_arrow_all()
+            if table is None or table.num_rows == 0:
+                raise ValueError(f"{spec['COLUMN']}: parent {spec['PARENT']} has no rows")
+            keys[spec["COLUMN"]] = table.column(0).combine_chunks()
+    finally:
+        cursor.close()
+    return keys
+
+
+def _generate_column(spec, n, offset, rng, fk_keys):
+    family = _column_family(spec)
+    kind = spec["DISTRIBUTION"]
+    if kind == "sequence":
+        values = np.arange(offset, offset + n, dtype=np.int64) + int(float(spec["MIN"] or 1))
+    elif kind == "uniform":
+        if family == "int":
+            values = rng.integers(int(float(spec["MIN"])), int(float(spec["MAX"])), size=n, endpoint=True)
+        else:
+            values = rng.uniform(float(spec["MIN"]), float(spec["MAX"]), size=n)
+    elif kind == "normal":
+        values = rng.normal(float(spec["MEAN"]), float(spec["STDDEV"]), size=n)
+        if family == "int":
+            values = np.rint(values).astype(np.int64)
+    elif kind == "date":
+        unit = "D" if family == "date" else "s"
+        low, high = np.datetime64(spec["MIN"], unit), np.datetime64(spec["MAX"], unit)
+        values = low + rng.integers(0, (high - low).astype(np.int64), size=n, endpoint=True).astype(f"timedelta64[{unit}]")
+    elif kind == "categorical":
+        choices, weights = _categorical(spec)
+        choices = np.array([_parse_value(choice, family) for choice in choices])
+        values = choices[rng.choice(len(choices), size=n, p=weights / weights.sum())]
+    elif kind == "foreign key":
+        keys = fk_keys[spec["COLUMN"]]
+        values = keys.take(pa.array(rng.integers(0, len(keys), size=n)))
+    elif kind == "text":
+        numbers = rng.integers(int(float(spec["MIN"])), int(float(spec["MAX"])), size=n, endpoint=True)
+        values = pc.binary_join_element_wise(f"{spec['COLUMN']}_", pc.cast(pa.array(numbers), pa.string()), "")
+    else:
+        return pa.nulls(n)
+    if family == "float" and spec["SCALE"] and isinstance(values, np.ndarray):
+        values = np.round(values, int(spec["SCALE"]))
+    array = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values)
+    if family == "text" and array.type != pa.string():
+        array = pc.cast(array, pa.string())
+    if family == "text" and spec["LENGTH"]:
+        array = pc.utf8_slice_codeunits(array, 0, int(spec["LENGTH"]))
+    null_fraction = float(spec["NULL_FRACTION"] or 0)
+    if null_fraction > 0:
+        array = pc.if_else(pa.array(rng.random(n) < null_fraction), pa.nulls(n, array.type), array)
+    return array
+
+
+# Yield `rows` rows of synthetic data as Arrow tables of up to chunk_rows rows. Every column of every
+# chunk draws from its own generator seeded with (seed, chunk, column), so the same settings always
+# produce the same data and editing one column doesn't change the others.
+def generate_test_data(specs, rows, seed=42, chunk_rows=TESTDATA_CHUNK_ROWS, fk_keys=None):
+    for chunk, offset in enumerate(range(0, rows, chunk_rows)):
+        n = min(chunk_rows, rows - offset)
+        yield pa.table({spec["COLUMN"]: _generate_column(spec, n, offset, np.random.default_rng([seed, chunk, position]), fk_keys or {})
+                        for position, spec in enumerate(specs)})
+
+
+def _sql_type(spec):
+    if spec["DATA_TYPE"] == "NUMBER":
+        return f"NUMBER(38, {int(spec['SCALE'] or 0)})"
+    return "VARCHAR" if spec["DATA_TYPE"] == "TEXT" else spec["DATA_TYPE"]
+
+
+def _sql_value(value, family):
+    if family in ("int", "float"):
+        return str(_parse_value(value, family))
+    if family == "bool":
+        return "TRUE" if _parse_value(value, family) else "FALSE"
+    return "'" + value.replace("'", "''") + "'"
+
+
+# Categorical weights as whole repeat counts for the weighted-array trick, at most ~1000 array entries
+def _weight_counts(weights):
+    if all(weight == int(weight) for weight in weights) and sum(weights) <= 1000:
+        divisor = functools.reduce(np.gcd, [int(weight) for weight in weights if weight])
+        return [int(weight) // divisor for weight in weights]
+    return [max(1, round(weight / weights.sum() * 1000)) if weight else 0 for weight in weights]
+
+
+# One INSERT ... SELECT FROM TABLE(GENERATOR(ROWCOUNT => rows)) producing the same kinds of
+# distributions as generate_test_data entirely inside Snowflake. Every column gets its own
+# RANDOM(seed); categorical columns index into an array holding each value `weight` times;
+# foreign keys join a numbered list of the parent's distinct keys on a random position.
+def generator_insert_sql(specs, database, schema, table, rows, seed=42):
+    ctes, selects, outer, joins = [], [], [], []
+    for position, spec in enumerate(specs):
+        family = _column_family(spec)
+        kind = spec["DISTRIBUTION"]
+        column = _quote_ident(spec["COLUMN"])
+        random_seed = seed * 1000 + position
+        if kind == "sequence":
+            expression = f"{int(float(spec['MIN'] or 1)) - 1} + ROW_NUMBER() OVER (ORDER BY SEQ8())"
+        elif kind == "uniform":
+            if family == "int":
+                expression = f"UNIFORM({int(float(spec['MIN']))}, {int(float(spec['MAX']))}, RANDOM({random_seed}))"
+            else:
+                expression = f"UNIFORM({float(spec['MIN'])}::FLOAT, {float(spec['MAX'])}::FLOAT, RANDOM({random_seed}))"
+        elif kind == "normal":
+            expression = f"NORMAL({float(spec['MEAN'])}::FLOAT, {float(spec['STDDEV'])}::FLOAT, RANDOM({random_seed}))"
+            if spec["DATA_TYPE"] == "NUMBER":
+                expression = f"ROUND({expression}, {int(spec['SCALE'] or 0)})"
+        elif kind == "date":
+            unit, cast, numpy_unit = ("DAY", "DATE", "D") if family == "date" else ("SECOND", "TIMESTAMP_NTZ", "s")
+            span = int((np.datetime64(spec["MAX"], numpy_unit) - np.datetime64(spec["MIN"], numpy_unit)).astype(np.int64))
+            expression = f"DATEADD({unit}, UNIFORM(0, {span}, RANDOM({random_seed})), '{spec['MIN']}'::{cast})"
+        elif kind == "categorical":
+            values, weights = _categorical(spec)
+            entries = [_sql_value(value, family) for value, count in zip(values, _weight_counts(weights)) for _ in range(count)]
+            expression = f"GET(ARRAY_CONSTRUCT({', '.join(entries)}), UNIFORM(0, {len(entries) - 1}, RANDOM({random_seed})))"
+        elif kind == "foreign key":
+            parent, parent_column = _parent_key(spec, database, schema)
+            ctes.append(f"FK_{position} AS (SELECT V, ROW_NUMBER() OVER (ORDER BY V) - 1 AS I "
+                        f"FROM (SELECT DISTINCT {parent_column} AS V FROM {parent} WHERE {parent_column} IS NOT NULL))")
+            ctes.append(f"FKN_{position} AS (SELECT COUNT(*) AS N FROM FK_{position})")
+            joins.append(f"CROSS JOIN FKN_{position} JOIN FK_{position} ON FK_{position}.I = MOD(ABS(G.K_{position}), FKN_{position}.N)")
+            selects.append(f"RANDOM({random_seed}) AS K_{position}")
+            expression = None
+        elif kind == "text":
+            prefix = _sql_value(f"{spec['COLUMN']}_", "text")
+            expression = f"{prefix} || UNIFORM({int(float(spec['MIN']))}, {int(float(spec['MAX']))}, RANDOM({random_seed}))"
+            if spec["LENGTH"]:
+                expression = f"LEFT({expression}, {int(spec['LENGTH'])})"
+        else:
+            expression = "NULL"
+        if expression is not None:
+            selects.append(f"{expression} AS {column}")
+            value = f"G.{column}"
+        else:
+            value = f"FK_{position}.V"
+        if float(spec["NULL_FRACTION"] or 0) > 0:
+            value = f"IFF(UNIFORM(0::FLOAT, 1::FLOAT, RANDOM({random_seed + 500})) < {float(spec['NULL_FRACTION'])}, NULL, {value})"
+        outer.append(f"{value}::{_sql_type(spec)}" if kind != "null" else "NULL")
+    ctes.append(f"G AS (SELECT {', '.join(selects) or 'SEQ8() AS S'} FROM TABLE(GENERATOR(ROWCOUNT => {int(rows)})))")
+    columns = ", ".join(_quote_ident(spec["COLUMN"]) for spec in specs)
+    return (f"INSERT INTO {_qualified(database, schema, table)} ({columns})\n"
+            + "WITH " + ",\n     ".join(ctes) + "\n"
+            + "SELECT " + ",\n       ".join(outer) + "\n"
+            + " ".join(["FROM G"] + joins))
+
+with st.sidebar:
+    with st.expander("Connection pool"):
+        pool_stats = get_connection_pool().stats()
+        st.write(f"Sessions: {pool_stats['in_use']} in use / {pool_stats['idle']} idle / {pool_stats['max_size']} max")
+        st.write(f"Hits: {pool_stats['hits']}  Misses: {pool_stats['misses']}  Hit rate: {pool_stats['hit_rate']:.0%}")
+        st.write(f"Waits: {pool_stats['waits']}  Total wait: {pool_stats['wait_time_s']:.2f}s  Evictions: {pool_stats['evictions']}")
+
+if tool == "PARALLEL EXECUTE":
+
+                # Function to execute queries in parallel: submitted asynchronously over a few pooled
+                # sessions and yielded in completion order
+                def execute_queries(queries, max_sessions=4, plan=None, use_cache=True, statement_timeout=None, fail_fast=False, priority=1):
+                    engine = AsyncQueryEngine((account, role, warehouse, database, schema, user, password), max_sessions=max_sessions,
+                                              cache=get_result_cache() if use_cache else None,
+                                              statement_timeout=statement_timeout, fail_fast=fail_fast,
+                                              admission=get_admission_controller(), priority=priority, spill=get_result_spill())
+                    return QueryBatch(engine, queries, depends_on=[step["depends_on"] for step in plan] if plan else None).start()
+
+                # Job board of a batch: every statement's state, query ID and elapsed time with cancel buttons,
+                # then the results in completion order. Refreshes itself every second while the batch runs.
+                def show_batch(batch, live):
+                    if live and batch.done:
+                        st.rerun()
+                    finished = sum(job.finished_at is not None for job in batch.jobs)
+                    elapsed = (batch.finished_at or time.monotonic()) - batch.started_at
+                    header, cancel_all = st.columns([4, 1])
+                    header.write(f"**{finished}/{len(batch.jobs)} statements finished** · {elapsed:.1f}s")
+                    if not batch.done and cancel_all.button("Cancel all", key=f"cancel_all_{batch.id}"):
+                        batch.cancel_all()
+                    for job in batch.jobs:
+                        if job.finished_at is None:
+                            c1, c2, c3, c4, c5 = st.columns([1, 2, 3, 1, 6])
+                            c1.write(f"#{job.index + 1}")
+                            c2.write(job.status if job.cancel_reason is None else "CANCELLING")
+                            c3.write(job.query_id or "")
+                            c4.write(f"{job.elapsed:.1f}s")
+                            c5.write(textwrap.shorten(job.sql, 100))
+                            if c1.button("✖", key=f"cancel_{batch.id}_{job.index}", help="Cancel this statement"):
+                                batch.cancel(job.index)
+                    for job in batch.completed:
+                        show_query_result(job)
+                    if batch.error:
+                        st.error(f"Batch failed: {batch.error}")
+                    elif batch.done:
+                        st.success("All queries executed!")
+
+                # Show how the statements will be scheduled before anything runs
+                def show_plan(plan):
+                    waves = max(step["wave"] for step in plan)
+                    with st.expander(f"Execution plan: {len(plan)} statements in {waves} wave(s)", expanded=waves > 1):
+                        st.dataframe(pd.DataFrame({
+                            "#": [step["index"] + 1 for step in plan],
+                            "Wave": [step["wave"] for step in plan],
+                            "Waits for": [", ".join(str(i + 1) for i in sorted(step["depends_on"])) for step in plan],
+                            "Reads": [", ".join(sorted(step["reads"])) for step in plan],
+                            "Writes": [", ".join(sorted(step["writes"])) + (" (barrier)" if step["barrier"] else "") for step in plan],
+                            "Statement": [textwrap.shorten(step["statement"], 120) for step in plan],
+                        }), hide_index=True)
+
+                # Show one finished query: the pages loaded so far plus a "load more" button, and downloads
+                # of the whole result written from its spill file
+                def show_query_result(job):
+                    if job.error:
+                        st.error(f"Query: {job.sql}\n{job.status}: {job.error}\nQuery ID: {job.query_id}\nTime taken: {job.elapsed:.2f} seconds")
+                        return
+                    result = job.result
+                    if job.status == "CACHED":
+                        st.success(f"Query: {job.sql} Served from result cache (query ID {result.query_id})")
+                    else:
+                        st.success(f"Query: {job.sql} Time taken: {job.elapsed:.2f} seconds")
+                    if not result.available:
+                        st.warning(f"The spilled result of query {result.query_id} was evicted from disk; run the query again to see it.")
+                        return
+                    if result.has_more and st.button(f"Load next {result.page_rows} rows", key=f"load_more_{job.index}_{result.query_id}"):
+                        result.load_more()
+                    if result.spilled:
+                        spilled = "all" if result.spill_done else f"{result.spilled_rows:,}"
+                        st.caption(f"Showing {result.loaded_rows:,} of {result.total_rows:,} rows · {spilled} rows spilled to disk "
+                                   f"({_format_bytes(result.spilled_bytes)} of {_format_bytes(result.total_bytes)})")
+                    else:
+                        st.caption(f"Showing {result.loaded_rows:,} of {result.total_rows:,} rows · "
+                                   f"{_format_bytes(result.loaded_bytes)} loaded of {_format_bytes(result.total_bytes)} "
+                                   f"({_format_bytes(result.compressed_bytes)} compressed)")
+                    st.dataframe(result.to_arrow())
+                    c1, c2 = st.columns(2)
+                    if result.total_bytes <= RESULT_DOWNLOAD_MAX_BYTES:
+                        c1.download_button("Download Parquet", data=lambda: result.export("parquet").read_bytes(),
+                                           file_name=f"{result.query_id}.parquet", mime="application/vnd.apache.parquet",
+                                           key=f"parquet_{job.index}_{result.query_id}")
+                        c2.download_button("Download CSV (gzip)", data=lambda: result.export("csv.gz").read_bytes(),
+                                           file_name=f"{result.query_id}.csv.gz", mime="application/gzip",
+                                           key=f"csv_{job.index}_{result.query_id}")
+                    else:
+                        for column, fmt, label in ((c1, "parquet", "Parquet"), (c2, "csv.gz", "CSV (gzip)")):
+                            if column.button(f"Export {label} on the app host", key=f"{fmt}_{job.index}_{result.query_id}"):
+                                column.caption(f"Wrote {result.export(fmt)}")
 
                 # Streamlit UI
 
@@ -95,6 +3298,8 @@ with tab1:
                     if st.sidebar.button("Connect"):
                         #st.sidebar.set_visible(False)
                         connection = create_snowflake_connection(account, role, warehouse, database, schema, user, password)
+                        if connection:
+                            get_connection_pool().checkin(connection)
                     st.title("My Snowsight")
                     #link to  YouTube channel
                     # st.markdown(" 👉 [🎥Visit my YouTube channel for more details](https://bit.ly/atozaboutdata)")
@@ -103,90 +3308,148 @@ with tab1:
 
                     # Text area to input queries
                     queries = st.text_area("Input queries separated by ; to execute all in parallel",height=200)
-                    query_list = [q.strip() for q in queries.split(';') if q.strip()]
+                    query_list = split_sql_statements(queries)
+                    plan = plan_statements(query_list, database, schema)
+                    if plan:
+                        show_plan(plan)
 
+                    max_sessions = st.number_input("Sessions to spread the queries over", min_value=1, max_value=get_connection_pool().max_size, value=4)
+                    use_cache = st.checkbox("Reuse cached results for read-only queries", value=True)
+                    c1, c2, c3 = st.columns(3)
+                    statement_timeout = c1.number_input("Statement timeout in seconds (0 = warehouse default)", min_value=0, value=0, step=60)
+                    priority = ["High", "Normal", "Low"].index(c2.selectbox("Priority on the shared warehouse", ["High", "Normal", "Low"], index=1))
+                    fail_fast = c3.checkbox("Fail fast: cancel everything else when a statement fails", value=False)
                     if st.button("Execute Queries"):
 
                         if query_list:
-                            with st.spinner("Executing all queries..."):
+                            batch = st.session_state.get("parallel_batch")
+                            if batch is not None and not batch.done:
+                                batch.cancel_all()
+                            st.session_state["parallel_batch"] = execute_queries(query_list, max_sessions=max_sessions, plan=plan, use_cache=use_cache,
+                                                                                 statement_timeout=statement_timeout or None, fail_fast=fail_fast,
+                                                                                 priority=priority)
+                    # The batch lives in session state, so the board (and "Load more") survives reruns
+                    batch = st.session_state.get("parallel_batch")
+                    if batch is not None:
+                        live = not batch.done
+                        st.fragment(show_batch, run_every=1.0 if live else None)(batch, live)
 
-                                results = execute_queries(query_list)
-                                st.success("All queries executed!")
-                                for res in results:
-                                    st.write(res)
+                    with st.expander("Result cache"):
+                        cache_stats = get_result_cache().stats()
+                        st.write(f"Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits / {cache_stats['misses']} misses)")
+                        st.write(f"Entries: {cache_stats['entries']}  Held: {_format_bytes(cache_stats['bytes'])} of {_format_bytes(cache_stats['max_bytes'])}")
+                        st.write(f"Evictions: {cache_stats['evictions']}  Invalidations: {cache_stats['invalidations']}")
+                        if st.button("Clear result cache"):
+                            get_result_cache().clear()
+
+                    with st.expander("Result spill"):
+                        spill_stats = get_result_spill().stats()
+                        st.write(f"Files: {spill_stats['files']}  On disk: {_format_bytes(spill_stats['bytes'])} of {_format_bytes(spill_stats['max_bytes'])}")
+                        st.write(f"Evictions: {spill_stats['evictions']}")
 
                 if __name__ == "__main__":
                     main()
-with tab2:
+if tool == "LOAD FILE":
             def main():
                 st.title('Upload File to Snowflake')
                 # st.markdown(" 👉 [🎥Visit my YouTube channel for more details](https://bit.ly/atozaboutdata)")
                 st.markdown('<p style="color: yellow;">👉🎥 Visit my YouTube channel for more details <a href="https://bit.ly/atozaboutdata">🎥click</a></p>', unsafe_allow_html=True)
                 file = st.file_uploader('Upload file', type=['xls', 'xlsx', 'csv', 'txt'])
+                local_path = st.text_input(f'...or path of a file under {LOAD_FILE_ROOT} on the app host (for multi-GB files)') if LOAD_FILE_ROOT else ''
 
-                if file is not None:
-                    # Read the file
-                    file_extension = file.name.split('.')[-1]
+                source = file
+                if file is None and local_path:
+                    try:
+                        source = str(resolve_load_path(local_path))
+                    except ValueError as e:
+                        st.error(str(e))
+                if source is not None:
+                    # Read only a preview; the full file is streamed in chunks on save
+                    file_name = file.name if file is not None else source
+                    file_size = file.size if file is not None else os.path.getsize(source)
+                    file_extension = file_name.split('.')[-1]
                     if file_extension.lower() in ['xls', 'xlsx', 'csv', 'txt']:
-                        data = pd.read_excel(file) if file_extension.lower() in ['xls', 'xlsx'] else pd.read_csv(file, encoding='utf-8')
+                        data = read_file_preview(source, file_extension)
 
                         st.subheader('Preview of Uploaded Data')
                         st.write(data.head())
 
-                        # Save data to Snowflake
-                        conn = create_snowflake_connection(account, role, warehouse, database, schema, user, password)
-                        if conn:
-                            st.info('Connected to Snowflake!')
+                        table_name = st.text_input('Enter table name in Snowflake')
+                        memory_budget_mb = st.number_input('Memory budget per chunk (MB)', min_value=8, max_value=4096, value=64)
 
-                            table_name = st.text_input('Enter table name in Snowflake')
+                        # Column types are inferred from a sample once per file, then reviewed here; the table
+                        # is created with the Snowflake types and every chunk is converted to the compact dtypes
+                        schema_key = f"{file_name}:{file_size}"
+                        if st.session_state.get("load_schema_key") != schema_key:
+                            sample = read_file_preview(source, file_extension, nrows=LOAD_SAMPLE_ROWS)
+                            st.session_state["load_sample"] = sample
+                            st.session_state["load_schema"] = infer_load_schema(sample)
+                            st.session_state["load_schema_key"] = schema_key
+                        st.subheader('Column types')
+                        specs = st.data_editor(st.session_state["load_schema"], hide_index=True, use_container_width=True,
+                                               disabled=["COLUMN", "SAMPLED_DTYPE", "NULLS", "EXAMPLE"], key=f"load_schema_editor_{schema_key}",
+                                               column_config={"DTYPE": st.column_config.SelectboxColumn(options=list(LOAD_DTYPES), required=True)}).to_dict("records")
+                        sample = st.session_state["load_sample"]
+                        try:
+                            compact = apply_load_dtypes(sample, specs)
+                            st.caption(f"Sample of {len(sample):,} rows: {_format_bytes(int(sample.memory_usage(deep=True).sum()))} as read, "
+                                       f"{_format_bytes(compact.nbytes)} with these types")
+                        except ValueError as e:
+                            st.warning(str(e))
 
-                            if st.button('Save to Snowflake'):
-                                try:
-                                    data_f=pd.DataFrame(data)
-                                    success, nchunks, nrows, _ = write_pandas(conn=conn,df=data_f,table_name=table_name,database=database,schema=schema,auto_create_table=True)
-                                    
-                                    st.success(f'Dataloaded to snowflake table: {table_name}  rows : {nrows}')
-                                except Exception as e:
-                                    st.error(f'Error: {str(e)}')
-                        else:
-                            st.error('Unable to connect to Snowflake. Please check your credentials.')
+                        # Save data to Snowflake (connect only once the user actually saves)
+                        if st.button('Save to Snowflake'):
+                            with snowflake_session(account, role, warehouse, database, schema, user, password) as conn:
+                                if conn:
+                                    try:
+                                        chunk_rows = estimate_chunk_rows(source, file_extension, memory_budget_mb * 1024 * 1024)
+                                        status = st.empty()
+
+                                        def show_progress(stats):
+                                            elapsed = time.monotonic() - stats["started"]
+                                            status.info(f"Staged {stats['rows']:,} rows in {stats['files']} Parquet file(s) "
+                                                        f"({stats['rows'] / elapsed if elapsed else 0:,.0f} rows/sec)")
+
+                                        cursor = conn.cursor()
+                                        try:
+                                            cursor.execute(load_table_sql(specs, database, schema, table_name))
+                                        finally:
+                                            cursor.close()
+                                        chunks = (apply_load_dtypes(chunk, specs) for chunk in iter_file_chunks(source, file_extension, chunk_rows))
+                                        stats = bulk_load_chunks(conn, chunks, table_name, database, schema, auto_create_table=False,
+                                                                 on_progress=show_progress)
+                                        nrows = stats["rows"]
+                                        st.success(f'Dataloaded to snowflake table: {table_name}  rows : {nrows}')
+                                        peak_rss = f" · process peak RSS {_format_bytes(stats['peak_rss_bytes'])}" if stats["peak_rss_bytes"] else ""
+                                        status.info(f"{stats['rows_per_sec']:,.0f} rows/sec · {file_size / 1024 / 1024 / stats['elapsed'] if stats['elapsed'] else 0:,.1f} MB/sec · "
+                                                    f"{stats['files']} file(s), {_format_bytes(stats['parquet_bytes'])} Parquet · "
+                                                    f"{chunk_rows:,} rows/chunk, peak chunk {_format_bytes(stats['peak_chunk_bytes'])}{peak_rss}")
+                                    except Exception as e:
+                                        st.error(f'Error: {str(e)}')
+                                else:
+                                    st.error('Unable to connect to Snowflake. Please check your credentials.')
 
             if __name__ == '__main__':
                 main()
-with tab3:
+if tool == "DOCUMENT AI":
             def main():
-                def get_gemini_response(input,image,prompt):
-                    model = genai.GenerativeModel('gemini-1.5-flash')
-                    response = model.generate_content([input,image[0],prompt])
-                    return response.text
-                
-                def input_image_setup(uploaded_file):
-                    # Check if a file has been uploaded
-                    if uploaded_file is not None:
-                        # Read the file into bytes
-                        bytes_data = uploaded_file.getvalue()
-
-                        image_parts = [
-                            {
-                                "mime_type": uploaded_file.type,  # Get the mime type of the uploaded file
-                                "data": bytes_data
-                            }
-                        ]
-                        return image_parts
-                    else:
-                        raise FileNotFoundError("No file uploaded")
                 st.markdown('<p style="color: yellow;">👉🎥 Visit my YouTube channel for more details <a href="https://bit.ly/atozaboutdata">🎥click</a></p>', unsafe_allow_html=True)
                 st.title('Document AI: Upload invoices and ask question')
                 left, right= st.columns(2)
                 with right:        
-                        uploaded_file = st.file_uploader("upload image",type=["jpg", "jpeg", "png"])
-                        image=""   
-                        if uploaded_file is not None:
-                            image = Image.open(uploaded_file)
-                            st.image(image, caption="Uploaded Image.", use_column_width=True)
+                        uploaded_files = st.file_uploader("upload images",type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+                        if uploaded_files:
+                            Image = _import("PIL.Image")
+                            st.image([Image.open(uploaded_file) for uploaded_file in uploaded_files[:4]],
+                                     caption=[uploaded_file.name for uploaded_file in uploaded_files[:4]], width=240)
+                            if len(uploaded_files) > 4:
+                                st.caption(f"... and {len(uploaded_files) - 4} more")
                 with left:
                         google_api_key = st.text_input("INPUT GOOGLE_API_KEY",key="google_api_key")
-                        genai.configure(api_key=google_api_key)  
+                        c1, c2, c3 = st.columns(3)
+                        workers = c1.number_input("Concurrent calls", min_value=1, max_value=64, value=8, key="invoice_workers")
+                        rate_per_minute = c2.number_input("Calls per minute", min_value=1, max_value=6000, value=60, key="invoice_rate")
+                        max_side = c3.number_input("Max image side (px)", min_value=256, max_value=8192, value=1600, step=64, key="invoice_max_side")
                         st.header("Invoice reader Application")
                         input=st.text_input("Ask about invoice: ",key="input")
                         submit=st.button("Submit",key="submit")
@@ -197,49 +3460,129 @@ with tab3:
                                     """
 
                         if submit:
-                            image_data = input_image_setup(uploaded_file)
-                            response=get_gemini_response(input_prompt,image_data,input)
-                            st.subheader("Answer: ")
-                            st.write(response)
+                            if not uploaded_files:
+                                st.error("No file uploaded")
+                                return
+                            model = GeminiInvoiceModel(google_api_key)
+                            items = [{"name": uploaded_file.name, "mime_type": uploaded_file.type, "data": uploaded_file.getvalue()}
+                                     for uploaded_file in uploaded_files]
+                            progress = st.progress(0.0)
+                            results = []
+                            started = time.monotonic()
+                            for result in answer_invoices(model, items, input_prompt, input, cache=get_invoice_answer_cache(),
+                                                          workers=workers, rate_per_minute=rate_per_minute, max_side=max_side):
+                                results.append(result)
+                                progress.progress(len(results) / len(items), text=f"{len(results)}/{len(items)} invoices")
+                            elapsed = time.monotonic() - started
+                            answered = [result for result in results if result["error"] is None]
+                            cached = sum(result["cached"] for result in results)
+                            original = sum(result["original_bytes"] for result in results if not result["cached"])
+                            sent = sum(result["sent_bytes"] for result in results)
+                            st.caption(f"{len(results)} invoices in {elapsed:.1f}s ({len(results) / max(elapsed, 1e-6):.1f}/s) · "
+                                       f"{cached} from cache · uploaded {_format_bytes(sent)} of {_format_bytes(original)}")
+                            for result in results:
+                                if result["error"]:
+                                    st.error(f"{result['name']}: {result['error']}")
+                            if len(results) == 1 and answered:
+                                st.subheader("Answer: ")
+                                st.write(answered[0]["answer"])
                             # current_timestamp = pd.Timestamp.now()  # Correct usage of datetime module
                             date_time =datetime.fromtimestamp(time.time()) 
 
                         # Dataframe creation with file details, question, response, and timestamp
                             data_to_save = pd.DataFrame({
-                                'FILENAME': [uploaded_file.name if uploaded_file else None],
-                                'QUESTION': [input],
-                                'RESPONSE': [response],
-                                'TIMESTAMP':[date_time]
+                                'FILENAME': [result["name"] for result in answered],
+                                'QUESTION': [input] * len(answered),
+                                'RESPONSE': [result["answer"] for result in answered],
+                                'TIMESTAMP':[date_time] * len(answered)
                             })
                             st.subheader('Preview of Uploaded Data')
-                            st.write(data_to_save.head())
+                            st.write(data_to_save)
                             table_name='INVOICE_DATA'
-                            write_pandas(conn=create_snowflake_connection(account, role, warehouse, database, schema, user, password),df=data_to_save,table_name=table_name,database=database,schema=schema,auto_create_table=True)
+                            if answered:
+                                if all([account, role, warehouse, database, schema, user, password]):
+                                    sink = get_write_behind_sink(table_name, account, role, warehouse, database, schema, user, password)
+                                    sink.append(data_to_save.to_dict("records"))
+                                    st.caption(f"Queued {len(data_to_save)} rows for {table_name}")
+                                else:
+                                    st.error('Unable to connect to Snowflake. Please check your credentials.')
+
+                if all([account, role, warehouse, database, schema, user, password]):
+                    with st.expander("INVOICE_DATA write-behind"):
+                        sink = get_write_behind_sink('INVOICE_DATA', account, role, warehouse, database, schema, user, password)
+                        if st.button("Flush now", key="invoice_flush"):
+                            try:
+                                sink.flush()
+                            except Exception as e:
+                                st.error(f"Flush failed: {str(e)}")
+                        sink_stats = sink.stats()
+                        st.write(f"Pending: {sink_stats['pending']} rows (oldest {sink_stats['oldest_s']:.0f}s)  Written: {sink_stats['written']} rows in {sink_stats['flushes']} flushes")
+                        st.write(f"Last batch: {sink_stats['last_batch_rows']} rows  Largest batch: {sink_stats['max_batch_rows']} rows")
+                        st.write(f"Flush time: last {sink_stats['last_flush_s']:.2f}s / avg {sink_stats['avg_flush_s']:.2f}s  Queue-to-table latency: {sink_stats['last_wait_s']:.1f}s")
+                        if sink_stats['last_error']:
+                            st.warning(f"{sink_stats['failures']} failed flushes, last: {sink_stats['last_error']}")
 
             if __name__ == '__main__':
                 main()
-with tab4:
+if tool == "GENERATE DDL":
+            # Characters of DDL shown in the code view; the download always has everything
+            DDL_VIEW_LIMIT = 1000000
+            DDL_SEPARATOR = "\n\n-------------------------------------------------------------------------------------------\n\n"
+
+            # Stream DDL into the code view and a local .sql file as cached entries and GET_DDL batches arrive
+            def show_ddl(catalog, creds, objects, file_name, header=None):
+                st.write("### Generate DDL")
+                progress = st.progress(0.0)
+                view = st.empty()
+                shown = [header] if header else []
+                shown_chars = len(header or "")
+                path = APP_DIR / "ddl" / file_name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as out:
+                    if header:
+                        out.write(header + DDL_SEPARATOR)
+                    for done, row in enumerate(catalog.ddl(creds, objects), start=1):
+                        text = row["ddl"] if not row["error"] else f"-- {row['type']} {row['name']}: {row['error']}"
+                        out.write(text + DDL_SEPARATOR)
+                        if shown_chars < DDL_VIEW_LIMIT:
+                            shown.append(text)
+                            shown_chars += len(text)
+                        if done % DDL_BATCH_SIZE == 0 or done == len(objects):
+                            combined_ddl = DDL_SEPARATOR.join(shown)
+                            language = "PYTHON" if "python" in combined_ddl.lower() else "SQL"
+                            view.code(combined_ddl, language=language)
+                            progress.progress(done / len(objects), text=f"{done}/{len(objects)} objects")
+                if path.stat().st_size > DDL_VIEW_LIMIT:
+                    st.info(f"Showing the first {_format_bytes(DDL_VIEW_LIMIT)} of DDL; download the file for everything.")
+                with open(path, "rb") as ddl_file:
+                    st.download_button("Download DDL", ddl_file, file_name=file_name, mime="text/plain")
+
             def main():
                   st.markdown('<p style="color: yellow;">👉🎥 Visit my YouTube channel for more details <a href="https://bit.ly/atozaboutdata">🎥click</a></p>', unsafe_allow_html=True)
                   st.title(":balloon: :balloon: Generate DDL :balloon: :balloon:")
                   st.write(":balloon: :balloon: This is to Generate DDL :balloon: :balloon:")
                   if all([account, role, warehouse, database, schema, user, password]):
-                    conn = create_snowflake_connection(account, role, warehouse, database, schema, user, password)
-                    cursor = conn.cursor()
+                    creds = (account, role, warehouse, database, schema, user, password)
+                    catalog = get_metadata_catalog(account, role, user, password)
+                    try:
+                        db_names = catalog.databases(creds)
+                    except Exception as e:
+                        st.error(f"Error connecting to Snowflake: {str(e)}")
+                        return
                     chk_box = st.selectbox("Do you want to Generate DDL for entire DB?",options=["YES","NO"] , index=1)
-                    
-                                     
-                         
-                    if conn and chk_box=='NO':
+                    left, right = st.columns([4, 1])
+                    left.caption(f"Metadata cached {catalog.age():.0f}s ago · DDL cache {catalog.ddl_hits} hits / {catalog.ddl_misses} misses")
+                    if right.button("Refresh metadata"):
+                        catalog.invalidate()
+                        db_names = catalog.databases(creds)
+
+                    if chk_box=='NO':
                                 st.info('Connected to Snowflake!')
-                                db_list = cursor.execute("SHOW DATABASES")
-                                db_names = [db[1] for db in db_list]
 
                                 db_name = st.selectbox("Select Database", db_names, key=f"selected_dbnames")
 
                                 if db_name:
-                                    sch_list = cursor.execute(f"SHOW SCHEMAS IN DATABASE {db_name}")
-                                    sch_names = [sch[1] for sch in sch_list]
+                                    sch_names = catalog.schemas(creds, db_name)
                                     sch_name = st.selectbox("Select Schema", sch_names, index=0, key=f"schemaname_list")
                                     if sch_name:
                                         entity_types = [
@@ -251,13 +3594,8 @@ with tab4:
                                         entity_type = st.selectbox("Select Object Type", entity_types)
 
                                         if entity_type:
-                                            if entity_type =='Function' or entity_type =='Procedure':
-                                                 ent_list = cursor.execute(f"SHOW USER {entity_type}S IN SCHEMA {db_name}.{sch_name}")
-                                                 ent_names = [ent[8] for ent in ent_list]  
-                                                 
-                                            else:
-                                                 ent_list = cursor.execute(f"SHOW {re.sub('Policy','Policie',entity_type)}S IN SCHEMA {db_name}.{sch_name}")
-                                                 ent_names = [ent[1] for ent in ent_list]
+                                            versions = dict(catalog.objects(creds, db_name, sch_name, entity_type))
+                                            ent_names = list(versions)
 
                                             # ent_names.insert(0, "ALL")
                                             
@@ -269,41 +3607,33 @@ with tab4:
                                                 else:
                                                     ent_type = re.sub(" ", "_", entity_type)
                                                 if st.button('Generate DDL'):
-                                                    ddl_statements = []
+                                                    objects = []
                                                     for entity_name in selected_entities:
                                                         ent_name = re.sub("(.*?) RETURN.*", "\\1", entity_name)
-                                                        ddl_query = f"SELECT GET_DDL('{ent_type}', '{db_name}.{sch_name}.{ent_name}', true) AS DDL"
-                                                        df = cursor.execute(ddl_query)
-                                                        ddl_statements.append(df.fetchone()[0])
-
-                                                    combined_ddl = "\n\n-------------------------------------------------------------------------------------------\n\n".join(ddl_statements)
-                                                    st.write("### Generate DDL")
-                                                    language = "PYTHON" if "python" in combined_ddl.lower() else "SQL"
-                                                    st.code(combined_ddl, language=language)
-                    if conn and chk_box=='YES':
+                                                        objects.append((ent_type, f"{db_name}.{sch_name}.{ent_name}", versions[entity_name]))
+                                                    show_ddl(catalog, creds, objects, f"{db_name}_{sch_name}_{ent_type}.sql")
+                    if chk_box=='YES':
                                 st.info('Connected to Snowflake!')
-                                db_list = cursor.execute("SHOW DATABASES")
-                                db_names = [db[1] for db in db_list]
 
                                 db_name = st.selectbox("Select Database", db_names, key=f"selected_dbnames")
 
                                 if db_name and st.button('Generate DDL'):
-                                     ddl_statements = []
-                                     ddl_query = f"SELECT GET_DDL('DATABASE', '{db_name}', true) AS DDL"
-                                     df = cursor.execute(ddl_query)
-                                     ddl_statements.append(df.fetchone()[0])
-                                     combined_ddl = "\n\n-------------------------------------------------------------------------------------------\n\n".join(ddl_statements)
-                                     st.write("### Generate DDL")
-                                     language = "PYTHON" if "python" in combined_ddl.lower() else "SQL"
-                                     st.code(combined_ddl, language=language)        
-                            # Close Snowflake cursor and connection
-                    cursor.close()
+                                     # One GET_DDL per schema instead of one for the whole database, so the
+                                     # schemas are extracted in parallel and no single DDL value gets huge;
+                                     # the database's own properties are rebuilt into the header
+                                     try:
+                                         header = database_ddl(creds, db_name)
+                                     except Exception as e:
+                                         st.error(f"Error reading database {db_name}: {str(e)}")
+                                         return
+                                     objects = [("SCHEMA", f"{db_name}.{sch}", None) for sch in catalog.schemas(creds, db_name) if sch != "INFORMATION_SCHEMA"]
+                                     show_ddl(catalog, creds, objects, f"{db_name}.sql", header=header)
                                     
                                 
             if __name__ == '__main__':
                 main()                
                
-with tab5:
+if tool == "REPLICATE DATABASE":
             def main():
                     st.markdown('<p style="color: yellow;">👉🎥 Visit my YouTube channel for more details <a href="https://bit.ly/atozaboutdata">🎥click</a></p>', unsafe_allow_html=True)
                     st.title(":balloon: :balloon: Replicate databse from one snowflake to another :balloon: :balloon:")
@@ -312,7 +3642,8 @@ with tab5:
                             conn = create_snowflake_connection(account, role, warehouse, database, schema, user, password)
                             if conn:
                                 st.success("Connection successful!")
-                                return conn
+                                get_connection_pool().checkin(conn)
+                                return True
                             else:
                                 st.error("Connection failed. Please check your credentials.")
                                 return None
@@ -387,112 +3718,138 @@ with tab5:
                     #         language = "PYTHON" if "python" in combined_ddl.lower() else "SQL"
                     #         st.code(combined_ddl, language=language)
                     # Function to replicate data between two Snowflake accounts
-                    def replicate_data(source_conn, dest_conn, source_database, source_schema, dest_database, dest_schema):
+                    def show_table_progress(item):
+                        rows_per_sec, mb_per_sec, eta = table_throughput(item)
+                        return {
+                            "Table": item["table"],
+                            "Status": item["status"],
+                            "Mode": item["mode"] or "",
+                            "Rows": f"{item['rows']:,} / {item['total_rows']:,}",
+                            "Rows/sec": f"{rows_per_sec:,.0f}",
+                            "MB/sec": f"{mb_per_sec:,.1f}",
+                            "ETA": f"{eta:,.0f}s" if eta is not None else "",
+                        }
+
+                    def replicate_data(source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, workers=4,
+                                       incremental=False, watermark_columns=None, chunk_rows=1000000, copy_modes=None):
                         try:
-                             # REPLICATE STRUCTURE OF ALL OBJECTS
-                            source_cursor = source_conn.cursor()
-                            ddl = []
-                            #ddl_q = f"SELECT GET_DDL('DATABASE', '{source_database}',TRUE) AS DDL"
-                            ddl_q = f'''
-                                        DECLARE
-                                            CUR CURSOR FOR SELECT CONCAT_WS('.',TABLE_CATALOG,TABLE_SCHEMA,'"'||TABLE_NAME||'"') AS NAME
-                                                        FROM INFORMATION_SCHEMA.TABLES
-                                                        WHERE TABLE_TYPE = 'BASE TABLE' AND  TABLE_NAME NOT LIKE '%TEMP_VIEW_DEFS%'
-                                                            AND TABLE_SCHEMA='{source_schema}' and IS_TEMPORARY='NO'
-                                                        ORDER BY CREATED ASC;
-                                                                                                    
-
-                                            BEGIN
-                                            CREATE OR REPLACE TEMPORARY TABLE TEMP_VIEW_DEFS(VIEW_NAME TEXT, DEFINITION TEXT);
-
-                                            FOR rec IN CUR DO   
-                                                EXECUTE IMMEDIATE REPLACE('INSERT INTO TEMP_VIEW_DEFS(VIEW_NAME, DEFINITION)
-                                                                    SELECT ''<VIEW_NAME>'', GET_DDL(''TABLE'', ''<VIEW_NAME>'')'
-                                                                    ,'<VIEW_NAME>'
-                                                                    ,rec.NAME);
-                                            END FOR;
-
-
-
-                                            LET rs RESULTSET := (SELECT LISTAGG(DEFINITION,' ') DDL FROM TEMP_VIEW_DEFS);
-
-                                            RETURN TABLE(rs);
-                                            END;
-                                     
-
-                                    '''
-                            df_q = source_cursor.execute(ddl_q)
-                            ddl.append(df_q.fetchone()[0])
-                            combined_ddl = "\n\n-------------------------------------------------------------------------------------------\n\n".join(ddl)
-                            dest_cursor=dest_conn.cursor()
-
-                            combined_ddl=f"BEGIN create or replace database {source_database}; create or replace schema {source_database}.{source_schema}; USE {source_database}.{source_schema}; {combined_ddl} END;"
-                            
-                            dest_cursor.execute(combined_ddl)
-                            st.toast("Structure of all source Snowflake created in Destination!", icon='🎉')
-                            time.sleep(0.5)
+                            same = same_account(source_creds, dest_creds)
+                            # The setup sessions go back to the pool before the copy starts: every copy worker takes two of its own
+                            with snowflake_session(*source_creds) as source_conn, snowflake_session(*dest_creds) as dest_conn:
+                                if not (source_conn and dest_conn):
+                                    st.error("Unable to establish connections to source and/or destination Snowflake accounts.")
+                                    return False
+                                dest_cursor=dest_conn.cursor()
+                                if same:
+                                    # Within one account tables are cloned (or created by the load) straight into the destination;
+                                    # replaying the DDL under the source's names would replace the source database itself
+                                    setup, ddl = [f"create database if not exists {dest_database}", f"create schema if not exists {dest_database}.{dest_schema}"], []
+                                else:
+                                     # REPLICATE STRUCTURE OF ALL OBJECTS
+                                    # GET_DDL runs in batches on pooled sessions; each table's DDL is replayed on its own
+                                    # instead of LISTAGG-ing everything into one (possibly >16MB) string
+                                    table_names = list_tables_by_creation(source_conn, source_database, source_schema)
+                                    ddl_rows = sorted(extract_ddl(source_creds, [("TABLE", name) for name in table_names], qualified=False),
+                                                      key=lambda row: row["index"])
+                                    failed = [row for row in ddl_rows if row["error"]]
+                                    if failed:
+                                        raise RuntimeError(f"GET_DDL failed for {failed[0]['name']}: {failed[0]['error']}")
+                                    ddl = [row["ddl"] for row in ddl_rows]
+
+                                    if incremental:
+                                        # Keep existing destination objects and data; only create what is missing
+                                        ddl = [re.sub(r"(?i)create\s+or\s+replace\s+((?:transient\s+)?table)\s+", r"create \1 IF NOT EXISTS ", statement) for statement in ddl]
+                                        setup = [f"create database if not exists {source_database}", f"create schema if not exists {source_database}.{source_schema}"]
+                                    else:
+                                        setup = [f"create or replace database {source_database}", f"create or replace schema {source_database}.{source_schema}"]
+                                    setup.append(f"USE {source_database}.{source_schema}")
+                                for statement in setup + ddl:
+                                    dest_cursor.execute(statement)
+                                dest_cursor.close()
+                                st.toast("Structure of all source Snowflake created in Destination!", icon='🎉')
+                                time.sleep(0.5)
 
 
-                            # source_tables = source_cursor.execute(f"SHOW TABLES IN {source_schema}")
-                            # table_names = [table[1] for table in source_tables]    
-
-                            # QRY_TBL=f'''
-                            #             SELECT CONCAT_WS('.',TABLE_CATALOG,TABLE_SCHEMA,'"'||TABLE_NAME||'"') AS NAME
-                            #                             FROM INFORMATION_SCHEMA.TABLES
-                            #                             WHERE TABLE_TYPE = 'BASE TABLE' AND  TABLE_NAME NOT LIKE '%TEMP_VIEW_DEFS%'
-                            #                                 AND TABLE_SCHEMA='{source_schema}' and IS_TEMPORARY='NO'
-                            #                             ORDER BY CREATED ASC
-                            #          '''        
-                            # Retrieve tables from source database/schema
-                            source_cursor = source_conn.cursor()
-                            Q_TBLS=f'''
-                                        BEGIN 
-
-                                            SHOW TABLES IN {source_database}.{source_schema};
-                                            LET A := SQLID;
-                                            LET rs RESULTSET :=(SELECT * FROM TABLE(RESULT_SCAN(:A)) WHERE "kind" ='TABLE');
-
-                                            RETURN TABLE(rs);
-                                        END;
-                                    '''
-                            # source_tables = source_cursor.execute(f"SHOW TABLES IN {source_schema}")
-                            source_tables = source_cursor.execute(Q_TBLS)
-                            table_names = [table[1] for table in source_tables]
-
-                            # Replicate each table from source to destination
-                            total_cnt_tbls = len(table_names)
+                                # Retrieve tables from source database/schema, largest first
+                                tables = list_tables_by_size(source_conn, source_database, source_schema)
+
+                            # Replicate the tables from source to destination, several at a time
+                            total_cnt_tbls = len(tables)
                             st.success(f"Total Tables to replicate: {total_cnt_tbls}")
-                            cnt_tbls=0
-                            for table_name in table_names:
-                                # Construct the fully qualified table name
-                                full_table_name = f'"{source_database}"."{source_schema}"."{table_name}"'
-                                full_table_name=full_table_name.strip("'")
-                                query = f"SELECT * FROM {full_table_name}"
-                                cnt_tbls=cnt_tbls+1;
-                                df = pd.read_sql(query, source_conn)
-                                success, nchunks, nrows, _ = write_pandas(conn=dest_conn, df=df, table_name=table_name, database=dest_database, schema=dest_schema)
-                                st.success(f'Source table: {table_name}  replicated in Destination DB with rows : {nrows}')
+                            overall = st.progress(0.0)
+                            board = st.empty()
+
+                            def show_progress(progress):
+                                total_rows = sum(item["total_rows"] for item in progress) or 1
+                                finished = sum(item["status"].startswith(("done", "skipped")) for item in progress)
+                                overall.progress(min(sum(item["rows"] for item in progress) / total_rows, 1.0),
+                                                 text=f"{finished}/{len(progress)} tables replicated")
+                                board.dataframe(pd.DataFrame([show_table_progress(item) for item in progress]), hide_index=True)
+
+                            # Each table goes by the copy mode measured fastest for its size (a same-account CLONE when possible)
+                            throughput = ReplicationThroughput.for_pair(source_creds, dest_creds)
+                            copy_table = functools.partial(copy_table_auto, throughput, copy_modes or (["clone"] if same else ["unload", "stream"]))
+                            if incremental:
+                                checkpoint = ReplicationCheckpoint.for_pair(source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema)
+                                checkpoint.start()
+                                if checkpoint.resuming:
+                                    st.info(f"Resuming interrupted run: {len(checkpoint.data['completed'])} table(s) already done")
+                                copy_table = functools.partial(copy_table_incremental, checkpoint, watermark_columns or {}, chunk_rows)
+                            progress = replicate_tables(source_creds, dest_creds, tables, source_database, source_schema,
+                                                        dest_database, dest_schema, workers=workers, on_progress=show_progress,
+                                                        copy_table=copy_table)
+                            cnt_tbls = sum(item["status"].startswith(("done", "skipped")) for item in progress)
+                            if incremental and cnt_tbls == total_cnt_tbls:
+                                checkpoint.finish()
+                            for item in progress:
+                                if item["error"]:
+                                    st.error(f"Source table: {item['table']} failed: {item['error']}")
+                            with st.expander("Throughput by copy mode"):
+                                st.dataframe(pd.DataFrame(throughput.summary()), hide_index=True)
                             st.toast("Data of all source Snowflake created in Destination!", icon='🎉')
                             time.sleep(0.5)
                                 
                             st.success(f"Data replication successful 🎉🎉🎉. Total {cnt_tbls}/{total_cnt_tbls} tables replicated.")
+                            return True
                         except Exception as e:
                             st.error(f"Error replicating data: {str(e)}")
 
                     # Execute replication process
+                    # Each table in flight holds a source and a destination session
+                    workers = st.number_input("Tables to copy in parallel", min_value=1, max_value=max(1, get_connection_pool().max_size // 2), value=4)
+                    incremental = st.radio("Replication mode", ["Full (recreate destination)", "Incremental (skip unchanged tables, resume interrupted runs)"]) != "Full (recreate destination)"
+                    watermark_columns = {}
+                    chunk_rows = 1000000
+                    copy_modes = None
+                    if incremental:
+                        watermark_text = st.text_area("Watermark columns for append-mostly tables, one TABLE=COLUMN per line (only rows above the destination's MAX(COLUMN) are copied)")
+                        for line in watermark_text.splitlines():
+                            if "=" in line:
+                                table_name, column_name = line.split("=", 1)
+                                watermark_columns[table_name.strip().upper()] = column_name.strip()
+                        chunk_rows = st.number_input("Rows per checkpointed chunk", min_value=10000, value=1000000, step=100000)
+                        checkpoint = ReplicationCheckpoint.for_pair((source_account,), (dest_account,), source_database, source_schema, dest_database, dest_schema)
+                        if checkpoint.path.exists():
+                            state = "interrupted, will resume" if not checkpoint.data.get("finished", True) else "last run finished"
+                            st.caption(f"Checkpoint {checkpoint.path} ({state}; {len(checkpoint.data['tables'])} table(s) synced before)")
+                            if st.button("Discard checkpoint"):
+                                checkpoint.discard()
+                    else:
+                        copy_methods = {"Automatic (fastest measured for the table size)": None,
+                                        "Bulk unload (COPY INTO @stage → GET/PUT → COPY INTO)": ["unload"],
+                                        "Streaming (Arrow batches through the app)": ["stream"]}
+                        if source_account and same_account((source_account,), (dest_account,)):
+                            copy_methods["Zero-copy CLONE (same account)"] = ["clone"]
+                        copy_modes = copy_methods[st.radio("Copy method", list(copy_methods))]
                     if st.button("Replicate Data"):
                         try:
-                            # Create connections to source and destination Snowflake accounts
-                            source_conn = create_snowflake_connection(source_account, source_role, source_warehouse, source_database, source_schema, source_user, source_password)
-                            dest_conn = create_snowflake_connection(dest_account, dest_role, dest_warehouse, dest_database, dest_schema, dest_user, dest_password)
-
-                            if source_conn and dest_conn:
-                                replicate_data(source_conn, dest_conn, source_database, source_schema, dest_database, dest_schema)
+                            source_creds = (source_account, source_role, source_warehouse, source_database, source_schema, source_user, source_password)
+                            dest_creds = (dest_account, dest_role, dest_warehouse, dest_database, dest_schema, dest_user, dest_password)
+                            if replicate_data(source_creds, dest_creds, source_database, source_schema, dest_database, dest_schema, workers=workers,
+                                              incremental=incremental, watermark_columns=watermark_columns, chunk_rows=chunk_rows, copy_modes=copy_modes):
                                 st.toast("All tables replicated successfully. Hurrayyaaaa !!", icon='🎉')
                                 time.sleep(1)
                                 st.balloons()
-                            else:
-                                st.error("Unable to establish connections to source and/or destination Snowflake accounts.")
                         except Exception as e:
                             st.error(f"Error: {str(e)}") 
                                 
@@ -500,14 +3857,132 @@ with tab5:
             
             if __name__ == '__main__':
                 main()
-with tab6:
+if tool == "TEST DATA GENERATOR":
             def main():
                     st.markdown('<p style="color: yellow;">👉🎥 Visit my YouTube channel for more details <a href="https://bit.ly/atozaboutdata">🎥click</a></p>', unsafe_allow_html=True)
                     st.title(":balloon: :balloon: Test Data Generator :balloon: :balloon:")
+                    if all([account, role, warehouse, database, schema, user, password]):
+                        creds = (account, role, warehouse, database, schema, user, password)
+                        catalog = get_metadata_catalog(account, role, user, password)
+                        try:
+                            db_names = catalog.databases(creds)
+                        except Exception as e:
+                            st.error(f"Error connecting to Snowflake: {str(e)}")
+                            return
+                        c1, c2, c3 = st.columns(3)
+                        db_name = c1.selectbox("Database", db_names, key="testdata_db")
+                        sch_name = c2.selectbox("Schema", catalog.schemas(creds, db_name) if db_name else [], key="testdata_schema")
+                        table_name = c3.selectbox("Table", [name for name, _ in catalog.objects(creds, db_name, sch_name, "Table")] if sch_name else [], key="testdata_table")
+                        if not table_name:
+                            return
+
+                        target = f"{db_name}.{sch_name}.{table_name}"
+                        if st.session_state.get("testdata_target") != target:
+                            with snowflake_session(account, role, warehouse, database, schema, user, password) as conn:
+                                if not conn:
+                                    return
+                                st.session_state["testdata_specs"] = default_column_specs(table_columns(conn, db_name, sch_name, table_name))
+                            st.session_state["testdata_target"] = target
+                        st.write("Column distributions (PARENT is TABLE.COLUMN of the referenced key for foreign keys; VALUES/WEIGHTS are comma separated)")
+                        specs = st.data_editor(st.session_state["testdata_specs"], hide_index=True, use_container_width=True,
+                                               disabled=["COLUMN", "DATA_TYPE", "SCALE", "LENGTH"], key=f"testdata_editor_{target}",
+                                               column_config={"DISTRIBUTION": st.column_config.SelectboxColumn(options=TESTDATA_DISTRIBUTIONS, required=True),
+                                                              "NULL_FRACTION": st.column_config.NumberColumn(min_value=0.0, max_value=1.0)}).to_dict("records")
+
+                        c1, c2, c3, c4 = st.columns(4)
+                        rows = int(c1.number_input("Rows", min_value=1, max_value=10**11, value=1000000, step=100000, key="testdata_rows"))
+                        seed = int(c2.number_input("Seed", min_value=0, value=42, key="testdata_seed"))
+                        chunk_rows = int(c3.number_input("Rows per chunk", min_value=1000, value=TESTDATA_CHUNK_ROWS, step=100000, key="testdata_chunk_rows"))
+                        mode = c4.radio("Generate", ["Locally (NumPy → staged Parquet)", "In Snowflake (GENERATOR)"], key="testdata_mode")
+                        pushdown = mode.startswith("In Snowflake")
+
+                        try:
+                            if pushdown:
+                                sql = generator_insert_sql(specs, db_name, sch_name, table_name, rows, seed)
+                                with st.expander("INSERT statement"):
+                                    st.code(sql, language="SQL")
+                            elif st.button("Preview", key="testdata_preview"):
+                                preview_specs = [spec if spec["DISTRIBUTION"] != "foreign key" else dict(spec, DISTRIBUTION="null") for spec in specs]
+                                st.dataframe(next(generate_test_data(preview_specs, 20, seed)).to_pandas())
+                        except Exception as e:
+                            st.error(f"Invalid column settings: {str(e)}")
+                            return
+
+                        if st.button("Generate test data", key="testdata_generate"):
+                            with snowflake_session(account, role, warehouse, database, schema, user, password) as conn:
+                                if not conn:
+                                    return
+                                started = time.monotonic()
+                                try:
+                                    if pushdown:
+                                        cursor = conn.cursor()
+                                        try:
+                                            inserted = cursor.execute(sql).fetchone()[0]
+                                        finally:
+                                            cursor.close()
+                                    else:
+                                        progress = st.progress(0.0)
+                                        fk_keys = load_foreign_keys(conn, specs, db_name, sch_name)
+                                        stats = bulk_load_chunks(conn, generate_test_data(specs, rows, seed, chunk_rows, fk_keys), table_name, db_name, sch_name,
+                                                                 auto_create_table=False,
+                                                                 on_progress=lambda stats: progress.progress(min(stats["rows"] / rows, 1.0), text=f"{stats['rows']:,}/{rows:,} rows generated"))
+                                        inserted = stats["rows"]
+                                except Exception as e:
+                                    st.error(f"Error generating test data: {str(e)}")
+                                    return
+                                elapsed = time.monotonic() - started
+                                st.success(f"Inserted {inserted:,} rows into {target} in {elapsed:.1f}s ({inserted / max(elapsed, 1e-6):,.0f} rows/s)")
                 
             if __name__ == '__main__':
                 main()              
                 
+with st.sidebar:
+    with st.expander("Admission control"):
+        admission = get_admission_controller()
+        st.write(f"Max concurrent statements per warehouse: {admission.max_limit}")
+        for gate in admission.stats():
+            st.write(f"**{gate['warehouse']}** ({gate['account']}): limit {gate['limit']:.1f} · {gate['running']} running · {gate['waiting']} waiting")
+            st.caption(f"Admitted {gate['admitted']} · avg wait {gate['avg_wait_s']:.2f}s · avg warehouse queue {gate['avg_queued_s']:.2f}s · "
+                       f"+{gate['increases']}/-{gate['decreases']} limit changes · per user {gate['users']}")
+
+    with st.expander("Query telemetry"):
+        telemetry = get_query_telemetry()
+        if all([account, role, warehouse, database, schema, user, password]) and st.button("Fetch Snowflake timings", key="telemetry_enrich"):
+            try:
+                with get_connection_pool().connection(account, role, warehouse, database, schema, user, password) as conn:
+                    # Read QUERY_HISTORY on the raw session so the lookup itself isn't recorded
+                    st.caption(f"Updated {telemetry.enrich(getattr(conn, 'raw', conn))} queries from QUERY_HISTORY_BY_SESSION")
+            except Exception as e:
+                st.error(f"Error reading query history: {str(e)}")
+        # The telemetry is shared by every session: only show the statements of the signed-in account/user
+        records = telemetry.records(account, user) if account and user else []
+        st.write(f"Statements recorded: {len(records)}")
+        if records:
+            st.dataframe(telemetry.summary(account, user).style.format("{:,.3f}", subset=["p50", "p90", "p99", "max"]))
+            st.write("Recent statements")
+            st.dataframe(pd.DataFrame(records[-200:]).drop(columns=["account", "user"]).iloc[::-1], hide_index=True)
+            c1, c2, c3 = st.columns(3)
+            for column, fmt in ((c1, "jsonl"), (c2, "parquet")):
+                if column.button(f"Export {fmt.upper()}", key=f"telemetry_export_{fmt}"):
+                    st.caption(f"Wrote {telemetry.export(fmt, account, user)}")
+            if c3.button("Clear", key="telemetry_clear"):
+                telemetry.clear(account, user)
+
+with st.sidebar:
+    with st.expander("App timings"):
+        timings = _app_timings()
+        run_s = time.perf_counter() - _RUN_STARTED
+        if timings["cold_start_s"] is None:
+            timings["cold_start_s"] = run_s
+        timings["runs"].append((tool, run_s))
+        st.write(f"Cold start: {timings['cold_start_s']:.2f}s  This run ({tool}): {run_s * 1000:,.0f}ms")
+        runs = pd.DataFrame(list(timings["runs"])[1:], columns=["tool", "seconds"])
+        if not runs.empty:
+            st.dataframe(runs.groupby("tool")["seconds"].describe(percentiles=[0.5, 0.9])[["count", "50%", "90%", "max"]]
+                         .rename(columns={"50%": "p50 s", "90%": "p90 s", "max": "max s"}))
+        for name, seconds in timings["imports"].items():
+            st.caption(f"import {name}: {seconds:.2f}s (first use)")
+
 # Adding a footer
 footer="""<style>
 a:link , a:visited{
@@ -0,0 +1,477 @@
+# In-process stand-in for a Snowflake account, used by benchmark.py to measure MYSNOWSIGHT's query,
+# load and replication paths without a live account. It implements the parts of
+# snowflake.connector the app uses (connect, cursor, execute/execute_async, query status polling,
+# fetch*/result batches, PUT/COPY through a stage, unload/LIST/GET, CLONE and write_pandas). Latency, per-row cost,
+# warehouse concurrency and failures are configurable; tables live in memory as Arrow tables.
+# StubInvoiceModel does the same for the DOCUMENT AI model calls.
+import enum
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+class QueryStatus(enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCESS = "SUCCESS"
+    FAILED_WITH_ERROR = "FAILED_WITH_ERROR"
+
+
+class SimulatedError(Exception):
+    pass
+
+
+def _name(name):
+    return ".".join(part.strip('"').upper() for part in re.findall(r'"[^"]*"|[^.]+', name.strip()))
+
+
+# Arrow types of the Snowflake column types tables are created with (anything else is text)
+_COLUMN_TYPES = [(r"NUMBER\(\d+, ?0\)|(BIG|SMALL|TINY)?INT(EGER)?$", pa.int64()), (r"NUMBER|DECIMAL|NUMERIC|FLOAT|DOUBLE|REAL", pa.float64()),
+                 (r"BOOLEAN", pa.bool_()), (r"DATE$", pa.date32()), (r"TIMESTAMP_[LT]TZ", pa.timestamp("us", "UTC")),
+                 (r"TIMESTAMP|DATETIME", pa.timestamp("us"))]
+
+
+def _arrow_type(snowflake_type):
+    for pattern, arrow_type in _COLUMN_TYPES:
+        if re.match(pattern, snowflake_type, re.IGNORECASE):
+            return arrow_type
+    return pa.string()
+
+
+# INFER_SCHEMA: Parquet integers of any width become NUMBER(38,0), dictionary columns their values
+def _inferred_schema(schema):
+    fields = []
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            field = field.with_type(pa.int64())
+        elif pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+# One simulated account: its tables, stages, running queries and the warehouse's concurrency limit.
+#   connect_latency    seconds to open a session
+#   statement_latency  fixed seconds per statement (network round trip + compile)
+#   per_row_cost       extra seconds per row a statement reads or writes
+#   max_concurrency    statements running at once; the rest queue (status QUEUED)
+#   bandwidth          bytes/sec for PUT uploads, GET downloads and result batch downloads
+#   batch_rows         rows per result batch
+#   failure_rate       probability that any statement fails
+#   fail_pattern       regex; statements matching it always fail
+class SimulatedSnowflake:
+    def __init__(self, connect_latency=0.2, statement_latency=0.05, per_row_cost=2e-7, max_concurrency=8,
+                 bandwidth=100e6, batch_rows=100000, failure_rate=0.0, fail_pattern=None, seed=0):
+        self.connect_latency = connect_latency
+        self.statement_latency = statement_latency
+        self.per_row_cost = per_row_cost
+        self.max_concurrency = max_concurrency
+        self.bandwidth = bandwidth
+        self.batch_rows = batch_rows
+        self.failure_rate = failure_rate
+        self.fail_pattern = re.compile(fail_pattern, re.IGNORECASE) if fail_pattern else None
+        self.tables = {}
+        self.stages = {}
+        self._queries = {}
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.sessions = 0
+        self.statements = 0
+        self.failures = 0
+        self.running = 0
+        self.peak_running = 0
+        self.queued_time = 0.0
+
+    def connect(self, account=None, user=None, password=None, role=None, warehouse=None, database=None, schema=None, **kwargs):
+        time.sleep(self.connect_latency)
+        with self._lock:
+            self.sessions += 1
+            session_id = self.sessions
+        return SimulatedConnection(self, account, user, database, schema, session_id)
+
+    def create_table(self, name, table):
+        with self._lock:
+            self.tables[_name(name)] = table
+
+    def _sleep_rows(self, rows):
+        time.sleep(self.per_row_cost * rows)
+
+    # Run one statement on a warehouse slot; returns an Arrow table of its result
+    def run(self, conn, sql, query):
+        queued = time.monotonic()
+        with self._slots:
+            with self._lock:
+                self.queued_time += time.monotonic() - queued
+                self.statements += 1
+                self.running += 1
+                self.peak_running = max(self.peak_running, self.running)
+                fail = self._random.random() < self.failure_rate or bool(self.fail_pattern and self.fail_pattern.search(sql))
+            if query is not None:
+                query["status"] = QueryStatus.RUNNING
+            started = time.monotonic()
+            try:
+                time.sleep(self.statement_latency)
+                if fail:
+                    with self._lock:
+                        self.failures += 1
+                    raise SimulatedError(f"000603 (XX000): SQL execution internal error (simulated): {sql[:80]}")
+                result = self._execute(conn, " ".join(sql.split()), query)
+                self._check_interrupted(conn, query, started)
+                return result
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    @staticmethod
+    def _check_interrupted(conn, query, started):
+        if query is not None and query.get("cancelled"):
+            raise SimulatedError("000604 (57014): SQL execution canceled")
+        if conn.statement_timeout and time.monotonic() - started > conn.statement_timeout:
+            raise SimulatedError(f"000630 (57014): Statement reached its statement or warehouse timeout of "
+                                 f"{conn.statement_timeout} second(s) and was canceled.")
+
+    # CALL SYSTEM$WAIT: sleep, but stop as soon as the query is cancelled or times out
+    def _wait(self, conn, query, seconds):
+        started = time.monotonic()
+        while time.monotonic() - started < seconds:
+            self._check_interrupted(conn, query, started)
+            time.sleep(0.01)
+
+    def _qualify(self, conn, name):
+        parts = _name(name).split(".")
+        return ".".join([(conn.database or "").upper(), (conn.schema or "").upper()][:3 - len(parts)] + parts)
+
+    def _execute(self, conn, sql, query=None):
+        upper = sql.upper()
+        if upper == "SELECT 1":
+            return pa.table({"1": [1]})
+        match = re.match(r"ALTER SESSION (SET|UNSET) STATEMENT_TIMEOUT_IN_SECONDS(?: = (\d+))?", sql, re.IGNORECASE)
+        if match:
+            conn.statement_timeout = int(match.group(2)) if match.group(1).upper() == "SET" else None
+            return _status("Statement executed successfully.")
+        match = re.match(r"CALL SYSTEM\$WAIT\((\d+(?:\.\d+)?)\)", sql, re.IGNORECASE)
+        if match:
+            self._wait(conn, query, float(match.group(1)))
+            return _status("waited")
+        match = re.match(r"SELECT SYSTEM\$CANCEL_QUERY\('([^']+)'\)", sql, re.IGNORECASE)
+        if match:
+            with self._lock:
+                target = self._queries.get(match.group(1))
+            if target is not None:
+                target["cancelled"] = True
+            return pa.table({"SYSTEM$CANCEL_QUERY": [f"query [{match.group(1)}] terminated."]})
+        match = re.match(r"USE (DATABASE|SCHEMA) (\S+)", sql, re.IGNORECASE)
+        if match:
+            if match.group(1).upper() == "DATABASE":
+                conn.database = match.group(2).strip('"')
+            else:
+                conn.schema = match.group(2).strip('"')
+            return _status("Statement executed successfully.")
+        match = re.match(r"CREATE TEMPORARY STAGE (\S+)", sql, re.IGNORECASE)
+        if match:
+            with self._lock:
+                self.stages[_name(match.group(1))] = []
+            return _status("Stage area successfully created.")
+        match = re.match(r"PUT 'file://(.+?)' @(\S+)", sql, re.IGNORECASE)
+        if match:
+            data = pq.read_table(match.group(1))
+            size = os.path.getsize(match.group(1))
+            time.sleep(size / self.bandwidth)
+            with self._lock:
+                self.stages[_name(match.group(2))].append(data)
+            return pa.table({"source": [match.group(1)], "status": ["UPLOADED"], "size": [size]})
+        match = re.match(r"CREATE TABLE IF NOT EXISTS (\S+) USING TEMPLATE .*LOCATION => '@(\S+?)'", sql, re.IGNORECASE)
+        if match:
+            target = self._qualify(conn, match.group(1))
+            with self._lock:
+                if target not in self.tables:
+                    self.tables[target] = _inferred_schema(self.stages[_name(match.group(2))][0].schema).empty_table()
+            return _status(f"Table {target} successfully created.")
+        match = re.match(r"CREATE TABLE IF NOT EXISTS (\S+) \((.*)\)$", sql, re.IGNORECASE)
+        if match:
+            target = self._qualify(conn, match.group(1))
+            columns = re.findall(r'("[^"]*"|\w+) (\w+(?:\([^)]*\))?)', match.group(2))
+            with self._lock:
+                if target not in self.tables:
+                    self.tables[target] = pa.schema([(name.strip('"'), _arrow_type(column_type)) for name, column_type in columns]).empty_table()
+            return _status(f"Table {target} successfully created.")
+        match = re.match(r'COPY INTO @("[^"]*"(?:\."[^"]*")*|[^\s/]+)\S* FROM (\S+)', sql, re.IGNORECASE)
+        if match:
+            # Unload: one Parquet "file" per batch_rows rows
+            source = self._qualify(conn, match.group(2))
+            with self._lock:
+                if source not in self.tables:
+                    raise SimulatedError(f"002003 (42S02): Table '{source}' does not exist or not authorized.")
+                data = self.tables[source]
+            self._sleep_rows(data.num_rows)
+            files = [data.slice(offset, self.batch_rows) for offset in range(0, max(data.num_rows, 1), self.batch_rows)]
+            with self._lock:
+                self.stages[_name(match.group(1))].extend(files)
+            return pa.table({"rows_unloaded": [data.num_rows], "input_bytes": [data.nbytes], "output_bytes": [data.nbytes // 4]})
+        match = re.match(r"LIST @(\S+)", sql, re.IGNORECASE)
+        if match:
+            stage = _name(match.group(1))
+            with self._lock:
+                files = list(self.stages[stage])
+            prefix = stage.split(".")[-1].lower()
+            return pa.table({"name": [f"{prefix}/data/data_0_{i}_0.snappy.parquet" for i in range(len(files))],
+                             "size": [data.nbytes // 4 for data in files]})
+        match = re.match(r'GET @("[^"]*"(?:\."[^"]*")*|[^\s/]+)/(\S+) \'file://(.+?)\'', sql, re.IGNORECASE)
+        if match:
+            with self._lock:
+                data = self.stages[_name(match.group(1))][int(re.search(r"data_0_(\d+)_0", match.group(2)).group(1))]
+            path = os.path.join(match.group(3), match.group(2).rsplit("/", 1)[-1])
+            pq.write_table(data, path, compression="snappy")
+            time.sleep(os.path.getsize(path) / self.bandwidth)
+            return pa.table({"file": [match.group(2)], "size": [os.path.getsize(path)], "status": ["DOWNLOADED"]})
+        match = re.match(r"CREATE OR REPLACE TABLE (\S+) CLONE (\S+)", sql, re.IGNORECASE)
+        if match:
+            target, source = self._qualify(conn, match.group(1)), self._qualify(conn, match.group(2))
+            with self._lock:
+                if source not in self.tables:
+                    raise SimulatedError(f"002003 (42S02): Object '{source}' does not exist or not authorized.")
+                self.tables[target] = self.tables[source]
+            return _status(f"Table {target} successfully created.")
+        match = re.match(r"COPY INTO (\S+) FROM @(\S+)", sql, re.IGNORECASE)
+        if match:
+            target = self._qualify(conn, match.group(1))
+            with self._lock:
+                files = self.stages[_name(match.group(2))]
+                if target not in self.tables:
+                    raise SimulatedError(f"002003 (42S02): Table '{target}' does not exist or not authorized.")
+                if "PURGE = TRUE" in upper:
+                    self.stages[_name(match.group(2))] = []
+            rows = sum(data.num_rows for data in files)
+            self._sleep_rows(rows)
+            with self._lock:
+                schema = self.tables[target].schema.remove_metadata()
+                self.tables[target] = pa.concat_tables([self.tables[target]] + [data.select(schema.names).cast(schema) for data in files],
+                                                       promote_options="permissive")
+            return pa.table({"file": [f"part_{i}" for i in range(len(files))], "status": ["LOADED"] * len(files),
+                             "rows_loaded": [data.num_rows for data in files]})
+        match = re.match(r"DROP STAGE IF EXISTS (\S+)", sql, re.IGNORECASE)
+        if match:
+            with self._lock:
+                self.stages.pop(_name(match.group(1)), None)
+            return _status("Statement executed successfully.")
+        match = re.search(r"FROM TABLE\(GENERATOR\(ROWCOUNT => (\d+)\)\)", sql, re.IGNORECASE)
+        if match and upper.startswith("SELECT"):
+            rows = int(match.group(1))
+            self._sleep_rows(rows)
+            seq = pa.array(range(rows), pa.int64())
+            return pa.table({"SEQ": seq, "VAL": pc.multiply(seq, 0.5)})
+        match = re.match(r"SELECT \* FROM (\S+)$", sql, re.IGNORECASE)
+        if match:
+            source = self._qualify(conn, match.group(1))
+            with self._lock:
+                if source not in self.tables:
+                    raise SimulatedError(f"002003 (42S02): Object '{source}' does not exist or not authorized.")
+                data = self.tables[source]
+            self._sleep_rows(data.num_rows)
+            return data
+        return _status("Statement executed successfully.")
+
+    def submit(self, conn, sql):
+        query_id = f"sim-{next(self._ids):08d}"
+        query = {"status": QueryStatus.QUEUED, "result": None, "error": None}
+        with self._lock:
+            self._queries[query_id] = query
+
+        def run():
+            try:
+                query["result"] = self.run(conn, sql, query)
+                query["status"] = QueryStatus.SUCCESS
+            except Exception as e:
+                query["error"] = e
+                query["status"] = QueryStatus.FAILED_WITH_ERROR
+
+        threading.Thread(target=run, daemon=True).start()
+        return query_id
+
+    def query(self, query_id):
+        with self._lock:
+            if query_id not in self._queries:
+                raise SimulatedError(f"Query {query_id} not found")
+            return self._queries[query_id]
+
+    # write_pandas: temporary stage + PUT + COPY, like the connector's helper
+    def write_pandas(self, conn, df, table_name, database=None, schema=None, auto_create_table=False, **kwargs):
+        data = pa.Table.from_pandas(df, preserve_index=False)
+        target = self._qualify(conn, ".".join(part for part in (database, schema, table_name) if part))
+        for _ in range(3):
+            self.run(conn, "SELECT 1", None)
+        time.sleep(data.nbytes / self.bandwidth)
+        self._sleep_rows(data.num_rows)
+        with self._lock:
+            if target not in self.tables:
+                if not auto_create_table:
+                    raise SimulatedError(f"002003 (42S02): Table '{target}' does not exist or not authorized.")
+                self.tables[target] = data.schema.empty_table()
+            self.tables[target] = pa.concat_tables([self.tables[target], data], promote_options="permissive")
+        return True, 1, data.num_rows, []
+
+
+def _status(message):
+    return pa.table({"status": [message]})
+
+
+# Drop-in for snowflake.connector.pandas_tools.write_pandas on a simulated connection
+def write_pandas(conn, df, table_name, database=None, schema=None, auto_create_table=False, **kwargs):
+    return conn.server.write_pandas(conn, df, table_name, database=database, schema=schema, auto_create_table=auto_create_table)
+
+
+class SimulatedConnection:
+    def __init__(self, server, account, user, database, schema, session_id):
+        self.server = server
+        self.account = account
+        self.user = user
+        self.database = database
+        self.schema = schema
+        self.session_id = session_id
+        self.statement_timeout = None
+        self._closed = False
+
+    def cursor(self):
+        return SimulatedCursor(self)
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
+    def get_query_status(self, query_id):
+        return self.server.query(query_id)["status"]
+
+    def get_query_status_throw_if_error(self, query_id):
+        query = self.server.query(query_id)
+        if query["status"] == QueryStatus.FAILED_WITH_ERROR:
+            raise query["error"]
+        return query["status"]
+
+    @staticmethod
+    def is_still_running(status):
+        return status in (QueryStatus.QUEUED, QueryStatus.RUNNING)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SimulatedResultBatch:
+    def __init__(self, server, data):
+        self.server = server
+        self.data = data
+        self.rowcount = data.num_rows
+        self.uncompressed_size = data.nbytes
+        self.compressed_size = data.nbytes // 4
+
+    def to_arrow(self):
+        time.sleep(self.compressed_size / self.server.bandwidth)
+        return self.data
+
+
+class SimulatedCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.sfqid = None
+        self.rowcount = None
+        self.description = None
+        self._result = None
+        self._position = 0
+
+    def _set_result(self, result):
+        self._result = result
+        self._position = 0
+        self.rowcount = result.num_rows
+        self.description = [(name, None, None, None, None, None, True) for name in result.column_names]
+
+    def execute(self, command, params=None, **kwargs):
+        if params:
+            command = command.replace("%s", "{}").format(*(repr(param) for param in params))
+        self.sfqid = f"sim-sync-{next(self.conn.server._ids):08d}"
+        self._set_result(self.conn.server.run(self.conn, command, None))
+        return self
+
+    def execute_async(self, command, params=None, **kwargs):
+        self.sfqid = self.conn.server.submit(self.conn, command)
+        return {"queryId": self.sfqid}
+
+    def get_results_from_sfqid(self, sfqid):
+        query = self.conn.server.query(sfqid)
+        while self.conn.is_still_running(query["status"]):
+            time.sleep(0.01)
+        if query["error"] is not None:
+            raise query["error"]
+        self.sfqid = sfqid
+        self._set_result(query["result"])
+
+    def _batches(self):
+        size = self.conn.server.batch_rows
+        return [self._result.slice(start, size) for start in range(0, self._result.num_rows, size)]
+
+    def get_result_batches(self):
+        return [SimulatedResultBatch(self.conn.server, data) for data in self._batches()]
+
+    def fetch_arrow_batches(self):
+        for batch in self.get_result_batches():
+            yield batch.to_arrow()
+
+    def fetch_arrow_all(self):
+        if self._result is None or self._result.num_rows == 0:
+            return None
+        return pa.concat_tables([batch.to_arrow() for batch in self.get_result_batches()])
+
+    def fetch_pandas_all(self):
+        return self._result.to_pandas()
+
+    def fetchmany(self, size=1):
+        rows = self._result.slice(self._position, size).to_pylist()
+        self._position += len(rows)
+        return [tuple(row.values()) for row in rows]
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        return self.fetchmany(self._result.num_rows - self._position)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Offline stand-in for mysnowsight.GeminiInvoiceModel with a fixed latency and an optional failure rate,
+# for testing batch throughput without an API key or quota
+class StubInvoiceModel:
+    name = "local-stub"
+
+    def __init__(self, latency=0.5, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def answer(self, prompt, image_part, question):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("stub model: simulated failure")
+        return f"[stub] {question} ({len(image_part['data'])} image bytes)"